@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
+import lxml.html
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
+import os
 import sys
 
 def fetch_19hz_html():
@@ -9,11 +13,12 @@ def fetch_19hz_html():
     url = "https://19hz.info/eventlisting_BayArea.php"
     
     # Headers to mimic a real browser request
-    # Note: removed Accept-Encoding to get uncompressed response
+    # Note: requests transparently decodes gzip/deflate, so response.text is unchanged
     headers = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
+        'Accept-Encoding': 'gzip, deflate',
         'Connection': 'keep-alive',
         'Upgrade-Insecure-Requests': '1',
         'Cache-Control': 'max-age=0'
@@ -22,17 +27,31 @@ def fetch_19hz_html():
     print(f"🌐 Fetching HTML from: {url}")
     print("-" * 50)
     
+    session = requests.Session()
+    session.headers.update(headers)
+    session.mount('https://', HTTPAdapter(
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504])
+    ))
+    
     try:
         # Make the request
-        response = requests.get(url, headers=headers, timeout=30)
+        response = session.get(url, timeout=30)
         response.raise_for_status()
         
         # Save the HTML
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         filename = f"19hz_events_{timestamp}.html"
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(response.text)
+        # Write the raw bytes when they are already UTF-8 and swap the file
+        # into place atomically so readers never see a partial page
+        content = response.content
+        if (response.encoding or '').lower().replace('-', '') != 'utf8':
+            content = response.text.encode('utf-8')
+        
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb', buffering=1 << 20) as f:
+            f.write(content)
+        os.replace(tmp_filename, filename)
         
         # Print success info
         print(f"✅ Success!")
@@ -44,14 +63,19 @@ def fetch_19hz_html():
         print(f"\n💾 HTML saved to: {filename}")
         
         # Check if it looks like the events page
-        if "eventListing" in response.text or "event" in response.text.lower():
+        html_lower = response.text.lower()
+        if "eventListing" in response.text or "event" in html_lower:
             print("✅ Looks like valid events HTML!")
             
-            # Quick stats about the content
-            import re
-            table_count = len(re.findall(r'<table', response.text, re.IGNORECASE))
-            tr_count = len(re.findall(r'<tr', response.text, re.IGNORECASE))
-            link_count = len(re.findall(r'<a\s+href', response.text, re.IGNORECASE))
+            # Quick stats about the content from a single walk of the parsed tree
+            table_count = tr_count = link_count = 0
+            for element in lxml.html.fromstring(response.content).iter('table', 'tr', 'a'):
+                if element.tag == 'table':
+                    table_count += 1
+                elif element.tag == 'tr':
+                    tr_count += 1
+                elif element.get('href') is not None:
+                    link_count += 1
             
             print(f"\n📈 Quick analysis:")
             print(f"   • Tables found: {table_count}")
@@ -1,73 +1,53 @@
 #!/usr/bin/env python3
-import json
-import time
-import requests
-from pathlib import Path
-from typing import Dict, Optional
+import asyncio
+import orjson
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from geocode_cache import GeocodeCache, NominatimClient, load_local_venues, make_key
 
 class SmartGeocoder:
-    def __init__(self, cache_file='geocode_cache.json', rate_limit_seconds=1.0):
+    def __init__(self, cache_file='geocode_cache.db', rate_limit_seconds=1.0):
         self.cache_file = cache_file
         self.rate_limit_seconds = rate_limit_seconds
         self.cache = self.load_cache()
-        self.last_request_time = 0
+        self.local_venues = load_local_venues()
         self.new_geocodes = 0
         self.cache_hits = 0
-        
-        # Nominatim requires a User-Agent
-        self.headers = {
-            'User-Agent': 'SF-Events-Map/1.0 (contact@example.com)'
-        }
-    
-    def load_cache(self) -> Dict:
-        """Load existing geocode cache from file"""
-        if Path(self.cache_file).exists():
-            with open(self.cache_file, 'r') as f:
-                cache = json.load(f)
-                print(f"📂 Loaded cache with {len(cache)} locations")
-                return cache
-        return {}
-    
-    def save_cache(self):
-        """Save geocode cache to file"""
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f, indent=2)
-        print(f"💾 Saved cache with {len(self.cache)} locations")
-    
-    def rate_limit(self):
-        """Ensure we respect the rate limit"""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.rate_limit_seconds:
-            time.sleep(self.rate_limit_seconds - elapsed)
-        self.last_request_time = time.time()
-    
-    def geocode_location(self, venue: str, city: str) -> Optional[Dict]:
+        self.nominatim = NominatimClient(self.cache, interval=rate_limit_seconds)
+    
+    def load_cache(self) -> GeocodeCache:
+        """Open the SQLite geocode cache, importing the old JSON cache once"""
+        cache = GeocodeCache(self.cache_file)
+        print(f"📂 Loaded cache with {len(cache)} locations")
+        return cache
+    
+    async def search(self, query: str) -> List[Dict]:
+        """Run a single rate-limited Nominatim search through the shared client"""
+        return await self.nominatim.search(query)
+    
+    async def geocode_location_async(self, venue: str, city: str) -> Optional[Dict]:
         """Geocode a single venue/city combination"""
-        cache_key = f"{venue}|{city}"
+        cache_key = make_key(venue, city)
         
         # Check cache first
         if cache_key in self.cache:
             self.cache_hits += 1
             return self.cache[cache_key]
         
-        # Rate limit before making request
-        self.rate_limit()
+        # Then venues we already know precisely from the events database
+        if cache_key in self.local_venues:
+            self.cache_hits += 1
+            self.cache[cache_key] = self.local_venues[cache_key]
+            return self.local_venues[cache_key]
+        
         self.new_geocodes += 1
         
         # Try venue + city first
         query = f"{venue}, {city}, CA"
-        url = f"https://nominatim.openstreetmap.org/search"
-        params = {
-            'q': query,
-            'format': 'jsonv2',
-            'limit': 1,
-            'countrycodes': 'us'
-        }
         
         try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await self.search(query)
             
             if data and len(data) > 0:
                 result = {
@@ -85,15 +65,11 @@ class SmartGeocoder:
         
         # Fallback: Try just city
         print(f"⚠️  Venue not found, trying city center for: {venue}, {city}")
-        self.rate_limit()
         
         city_query = f"{city}, CA"
-        params['q'] = city_query
         
         try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await self.search(city_query)
             
             if data and len(data) > 0:
                 result = {
@@ -112,8 +88,12 @@ class SmartGeocoder:
         # Cache the failure too, so we don't retry
         self.cache[cache_key] = None
         return None
+    
+    async def geocode_many(self, locations: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """Geocode many venue/city pairs concurrently under the shared rate limit"""
+        return await self.nominatim.geocode_many(self.geocode_location_async, locations)
 
-def main():
+async def main():
     # Load all events
     print("="*60)
     print("🗺️  SF EVENTS GEOCODER - COMPLETE DATASET")
@@ -123,33 +103,26 @@ def main():
     output_file = 'events_all_geocoded.json'
     
     print(f"\n📂 Loading events from {input_file}...")
-    with open(input_file, 'r') as f:
-        all_events = json.load(f)
-    
-    # Filter out hidden events
-    visible_events = [e for e in all_events if not e.get('hidden', False)]
-    print(f"📊 Found {len(visible_events)} visible events (out of {len(all_events)} total)")
-    
-    # Get unique venues
-    unique_venues = {}
-    for event in visible_events:
-        key = f"{event['venue']}|{event['city']}"
-        if key not in unique_venues:
-            unique_venues[key] = {
-                'venue': event['venue'],
-                'city': event['city'],
-                'events': []
-            }
-        unique_venues[key]['events'].append(event)
+    with open(input_file, 'rb') as f:
+        all_events = orjson.loads(f.read())
+    
+    # Skip hidden events and group the rest by venue in a single pass
+    unique_venues = defaultdict(list)
+    for event in all_events:
+        if not event.get('hidden', False):
+            unique_venues[(event['venue'], event['city'])].append(event)
     
+    visible_count = sum(len(venue_events) for venue_events in unique_venues.values())
+    print(f"📊 Found {visible_count} visible events (out of {len(all_events)} total)")
     print(f"📍 Found {len(unique_venues)} unique venue/city combinations")
     
     # Initialize geocoder
     geocoder = SmartGeocoder()
     
     # Check how many we already have cached
-    already_cached = sum(1 for key in unique_venues.keys() if key in geocoder.cache)
-    to_geocode = len(unique_venues) - already_cached
+    uncached = {pair for pair in unique_venues if make_key(*pair) not in geocoder.cache}
+    already_cached = len(unique_venues) - len(uncached)
+    to_geocode = len(uncached)
     
     print(f"\n✅ Already cached: {already_cached} locations")
     print(f"🔄 Need to geocode: {to_geocode} new locations")
@@ -168,49 +141,46 @@ def main():
     failed = 0
     approximate = 0
     
-    for i, (key, venue_info) in enumerate(unique_venues.items(), 1):
-        venue = venue_info['venue']
-        city = venue_info['city']
-        
-        # Show progress
-        if key not in geocoder.cache:
+    # Show progress for the lookups that will hit the network
+    for i, (venue, city) in enumerate(unique_venues, 1):
+        if (venue, city) in uncached:
             print(f"[{i}/{len(unique_venues)}] Geocoding NEW: {venue}, {city}")
-        
-        location = geocoder.geocode_location(venue, city)
-        
+    
+    # Geocode all venues concurrently; the shared limiter keeps us at 1 req/s
+    locations = await geocoder.geocode_many(list(unique_venues))
+    
+    for venue_events, location in zip(unique_venues.values(), locations):
         if location:
             successful += 1
             if location and location.get('approximate'):
                 approximate += 1
             
-            # Add coordinates to all events at this venue
-            for event in venue_info['events']:
-                event_with_coords = event.copy()
-                event_with_coords['coordinates'] = {
-                    'lat': location['lat'],
-                    'lon': location['lon'],
-                    'display_name': location['display_name'],
-                    'approximate': location.get('approximate', False)
-                }
-                events_with_coords.append(event_with_coords)
+            # One coordinates dict per venue, shared by all of its events
+            coords = {
+                'lat': location['lat'],
+                'lon': location['lon'],
+                'display_name': location['display_name'],
+                'approximate': location.get('approximate', False)
+            }
+            for event in venue_events:
+                event['coordinates'] = coords
+                events_with_coords.append(event)
         else:
             failed += 1
             # Still include the event without coordinates
-            for event in venue_info['events']:
-                event_with_coords = event.copy()
-                event_with_coords['coordinates'] = None
-                events_with_coords.append(event_with_coords)
-        
-        # Save cache periodically (every 10 new geocodes)
-        if geocoder.new_geocodes > 0 and geocoder.new_geocodes % 10 == 0:
-            geocoder.save_cache()
+            for event in venue_events:
+                event['coordinates'] = None
+                events_with_coords.append(event)
     
-    # Final save of cache
-    geocoder.save_cache()
+    # Results are persisted as they arrive; just release the cache
+    geocoder.cache.close()
     
-    # Save all geocoded events
-    with open(output_file, 'w') as f:
-        json.dump(events_with_coords, f, indent=2)
+    # Save all geocoded events; write a temp file and swap it in, since a
+    # running server.py reloads this file as soon as its mtime changes
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(orjson.dumps(events_with_coords, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_file, output_file)
     
     # Print summary
     print("\n" + "="*60)
@@ -233,4 +203,4 @@ def main():
     print("   You can now load this file directly without any geocoding delays.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""SQLite-backed key/value store for geocoding results, and the shared
+rate-limited Nominatim client that fills it"""
+
+import asyncio
+import atexit
+import re
+import sqlite3
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_PARENS_RE = re.compile(r'\([^)]*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+# Raw Nominatim responses are reused for 30 days
+RESPONSE_TTL_SECONDS = 30 * 24 * 3600
+
+# Fold the WAL into the database file at most this often while writing
+CHECKPOINT_SECONDS = 30
+
+NOMINATIM_SEARCH_URL = "https://nominatim.openstreetmap.org/search"
+
+# Extra attempts after a 429, each behind the rate limit and a growing backoff
+THROTTLE_RETRIES = 3
+
+def normalize_key(text: str) -> str:
+    """Fold case, accents, parentheticals and extra whitespace out of a name"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    text = _PARENS_RE.sub(' ', text.lower())
+    return _SPACE_RE.sub(' ', text).strip()
+
+def make_key(venue: str, city: str) -> str:
+    """Cache key for a venue/city pair, insensitive to formatting differences"""
+    return f"{normalize_key(venue)}|{normalize_key(city)}"
+
+def load_local_venues(db_path: str = 'events.db') -> Dict[str, Dict]:
+    """Precisely geocoded venues from the events database, keyed like the cache"""
+    if not Path(db_path).exists():
+        return {}
+    
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT name, city, latitude, longitude, display_name FROM venues "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL "
+            "AND NOT COALESCE(is_approximate, 0) AND NOT COALESCE(is_tba, 0)"
+        ).fetchall()
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+    
+    return {
+        make_key(name, city): {
+            'lat': lat,
+            'lon': lon,
+            'display_name': display_name or name,
+            'query': db_path,
+            'approximate': False
+        }
+        for name, city, lat, lon, display_name in rows
+    }
+
+class GeocodeCache:
+    """Dict-like geocode cache that persists each result as it is written
+    
+    Every assignment is a single INSERT OR REPLACE, so there is no need to
+    periodically rewrite the whole cache to disk. Values are stored as
+    compact orjson bytes. Failed lookups live in a separate misses table
+    that is held in memory as a set for O(1) short-circuiting.
+    """
+    
+    def __init__(self, db_file='geocode_cache.db', legacy_json='geocode_cache.json'):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-20000")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (q TEXT PRIMARY KEY, body TEXT, fetched_at REAL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS misses (k TEXT PRIMARY KEY)")
+        
+        # Move failures cached as JSON null in older databases into misses
+        self.conn.execute("BEGIN")
+        self.conn.execute(
+            "INSERT OR IGNORE INTO misses SELECT k FROM kv WHERE CAST(v AS TEXT) = 'null'"
+        )
+        self.conn.execute("DELETE FROM kv WHERE CAST(v AS TEXT) = 'null'")
+        self.conn.execute("COMMIT")
+        self.negative = {k for (k,) in self.conn.execute("SELECT k FROM misses")}
+        self._last_checkpoint = time.monotonic()
+        atexit.register(self.close)
+        
+        if legacy_json:
+            self.migrate_json(legacy_json)
+    
+    def migrate_json(self, json_file: str):
+        """One-time import of the old JSON cache into an empty database"""
+        if not Path(json_file).exists() or len(self) > 0:
+            return
+        
+        with open(json_file, 'rb') as f:
+            legacy = orjson.loads(f.read())
+        
+        self.conn.execute("BEGIN")
+        for k, v in legacy.items():
+            self[make_key(*k.split('|', 1)) if '|' in k else k] = v
+        self.conn.execute("COMMIT")
+        print(f"📦 Migrated {len(legacy)} cached locations from {json_file}")
+    
+    def get_response(self, query: str, max_age: float = RESPONSE_TTL_SECONDS) -> Optional[List]:
+        """Return a cached Nominatim response body if it is fresh enough"""
+        row = self.conn.execute(
+            "SELECT body FROM responses WHERE q = ? AND fetched_at > ?",
+            (query, time.time() - max_age)
+        ).fetchone()
+        return orjson.loads(row[0]) if row else None
+    
+    def put_response(self, query: str, body: str):
+        """Remember the raw response body for a Nominatim query"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (query, body, time.time())
+        )
+    
+    def get(self, key: str, default=None) -> Optional[Dict]:
+        if key in self.negative:
+            return None
+        row = self.conn.execute("SELECT v FROM kv WHERE k = ?", (key,)).fetchone()
+        return orjson.loads(row[0]) if row else default
+    
+    def __getitem__(self, key: str) -> Optional[Dict]:
+        if key in self.negative:
+            return None
+        row = self.conn.execute("SELECT v FROM kv WHERE k = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return orjson.loads(row[0])
+    
+    def __setitem__(self, key: str, value: Optional[Dict]):
+        if value is None:
+            self.negative.add(key)
+            self.conn.execute("INSERT OR IGNORE INTO misses VALUES (?)", (key,))
+            return
+        
+        self.conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?)", (key, orjson.dumps(value)))
+        if key in self.negative:
+            self.negative.discard(key)
+            self.conn.execute("DELETE FROM misses WHERE k = ?", (key,))
+        self.maybe_checkpoint()
+    
+    def maybe_checkpoint(self):
+        """Checkpoint the WAL on elapsed time rather than on write count"""
+        if time.monotonic() - self._last_checkpoint > CHECKPOINT_SECONDS:
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self._last_checkpoint = time.monotonic()
+    
+    def __contains__(self, key: str) -> bool:
+        if key in self.negative:
+            return True
+        return self.conn.execute("SELECT 1 FROM kv WHERE k = ?", (key,)).fetchone() is not None
+    
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0] + len(self.negative)
+    
+    def close(self):
+        """Fold the write-ahead log back into the database file and close"""
+        if self.conn is None:
+            return
+        atexit.unregister(self.close)
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.close()
+        self.conn = None
+
+class NominatimClient:
+    """Rate-limited geocoder searches shared by the scraper and the batch scripts
+    
+    Requests are spaced ``interval`` seconds apart across concurrent asyncio
+    tasks (0 turns the limit off, e.g. for a self-hosted Nominatim or Photon
+    at ``url``). Responses seen in the last 30 days are served from the
+    cache without touching the limit.
+    """
+    
+    def __init__(self, cache: GeocodeCache, url: str = NOMINATIM_SEARCH_URL,
+                 interval: float = 1.0, session: Optional[requests.Session] = None):
+        self.cache = cache
+        self.url = url
+        self.interval = interval
+        self.is_photon = url.rstrip('/').endswith('/api')
+        self._next_ok = 0.0  # monotonic time of the next allowed request
+        self._rate_lock = None
+        
+        if session is None:
+            # Nominatim requires a User-Agent; reuse one pooled connection.
+            # 429s are left to search() so retries stay behind the limiter
+            session = requests.Session()
+            session.headers.update({'User-Agent': 'SF-Events-Map/1.0 (contact@example.com)'})
+            adapter = HTTPAdapter(
+                pool_connections=2,
+                pool_maxsize=4,
+                max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+    
+    async def rate_limit(self):
+        """Space requests ``interval`` apart across concurrent lookups"""
+        if not self.interval:
+            return
+        async with self._rate_lock:
+            wait = self._next_ok - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_ok = time.monotonic() + self.interval
+    
+    def back_off(self, response, attempt: int):
+        """Hold back every lookup after the server answers 429 Too Many Requests"""
+        try:
+            delay = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            delay = max(self.interval, 1.0) * 2 ** (attempt + 1)
+        self._next_ok = max(self._next_ok, time.monotonic() + delay)
+    
+    async def search(self, query: str):
+        """Run a single rate-limited search and return the decoded response
+        
+        The HTTP call runs in a worker thread so the next lookup can take its
+        rate-limit slot while this response is still in flight. Nominatim
+        answers with a list of places, Photon with a GeoJSON dict.
+        """
+        cached = self.cache.get_response(query)
+        if cached is not None:
+            return cached
+        
+        if self.is_photon:
+            params = {'q': query, 'limit': 1}
+        else:
+            params = {
+                'q': query,
+                'format': 'jsonv2',
+                'limit': 1,
+                'countrycodes': 'us'
+            }
+        
+        # 429s are retried here rather than by the adapter, so every retry
+        # still waits for its slot in the shared rate limit
+        for attempt in range(THROTTLE_RETRIES + 1):
+            await self.rate_limit()
+            
+            # Another task may have fetched the same query while we waited
+            cached = self.cache.get_response(query)
+            if cached is not None:
+                return cached
+            
+            response = await asyncio.to_thread(
+                self.session.get, self.url, params=params, timeout=10
+            )
+            if response.status_code != 429 or attempt == THROTTLE_RETRIES:
+                break
+            self.back_off(response, attempt)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        self.cache.put_response(query, response.text)
+        return data
+    
+    async def geocode_many(self, geocode, locations: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """Run ``geocode(venue, city)`` for every pair concurrently under the shared limit
+        
+        Each request takes the next rate-limit slot as soon as it is issued,
+        so response time overlaps with the mandatory wait.
+        """
+        self._rate_lock = asyncio.Lock()
+        return await asyncio.gather(*(geocode(venue, city) for venue, city in locations))
@@ -1,68 +1,60 @@
 #!/usr/bin/env python3
-import json
-import time
+import asyncio
+import orjson
 import datetime
-import requests
-from pathlib import Path
+from collections import defaultdict
 from typing import Dict, List, Optional, Tuple
+from geocode_cache import GeocodeCache, NominatimClient, load_local_venues, make_key
+
+def group_by_weekday(events: List[Dict]) -> Dict[int, List[Dict]]:
+    """Bucket events by weekday, parsing each date only once"""
+    by_weekday = defaultdict(list)
+    for event in events:
+        by_weekday[datetime.date.fromisoformat(event['dateISO']).weekday()].append(event)
+    return by_weekday
+
+def group_by_venue(events: List[Dict]) -> Dict[Tuple[str, str], List[Dict]]:
+    """Group visible events under their (venue, city) pair in a single pass"""
+    by_venue = defaultdict(list)
+    for event in events:
+        if not event.get('hidden'):
+            by_venue[(event['venue'], event['city'])].append(event)
+    return by_venue
 
 class VenueGeocoder:
-    def __init__(self, cache_file='geocode_cache.json', rate_limit_seconds=1.0):
+    def __init__(self, cache_file='geocode_cache.db', rate_limit_seconds=1.0):
         self.cache_file = cache_file
         self.rate_limit_seconds = rate_limit_seconds
         self.cache = self.load_cache()
-        self.last_request_time = 0
-        
-        # Nominatim requires a User-Agent
-        self.headers = {
-            'User-Agent': 'SF-Events-Map/1.0 (contact@example.com)'
-        }
-    
-    def load_cache(self) -> Dict:
-        """Load existing geocode cache from file"""
-        if Path(self.cache_file).exists():
-            with open(self.cache_file, 'r') as f:
-                return json.load(f)
-        return {}
+        self.local_venues = load_local_venues()
+        self.nominatim = NominatimClient(self.cache, interval=rate_limit_seconds)
     
-    def save_cache(self):
-        """Save geocode cache to file"""
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f, indent=2)
-        print(f"💾 Saved cache with {len(self.cache)} locations to {self.cache_file}")
+    def load_cache(self) -> GeocodeCache:
+        """Open the SQLite geocode cache, importing the old JSON cache once"""
+        return GeocodeCache(self.cache_file)
     
-    def rate_limit(self):
-        """Ensure we respect the rate limit"""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.rate_limit_seconds:
-            time.sleep(self.rate_limit_seconds - elapsed)
-        self.last_request_time = time.time()
+    async def search(self, query: str) -> List[Dict]:
+        """Run a single rate-limited Nominatim search through the shared client"""
+        return await self.nominatim.search(query)
     
-    def geocode_location(self, venue: str, city: str) -> Optional[Dict]:
+    async def geocode_location_async(self, venue: str, city: str) -> Optional[Dict]:
         """Geocode a single venue/city combination"""
-        cache_key = f"{venue}|{city}"
+        cache_key = make_key(venue, city)
         
         # Check cache first
         if cache_key in self.cache:
             return self.cache[cache_key]
         
-        # Rate limit before making request
-        self.rate_limit()
+        # Then venues we already know precisely from the events database
+        if cache_key in self.local_venues:
+            self.cache[cache_key] = self.local_venues[cache_key]
+            return self.local_venues[cache_key]
         
         # Try venue + city first
         query = f"{venue}, {city}, CA"
-        url = f"https://nominatim.openstreetmap.org/search"
-        params = {
-            'q': query,
-            'format': 'jsonv2',
-            'limit': 1,
-            'countrycodes': 'us'
-        }
         
         try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await self.search(query)
             
             if data and len(data) > 0:
                 result = {
@@ -80,15 +72,11 @@ class VenueGeocoder:
         
         # Fallback: Try just city
         print(f"⚠️  Venue not found, trying city center for: {venue}, {city}")
-        self.rate_limit()
         
         city_query = f"{city}, CA"
-        params['q'] = city_query
         
         try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await self.search(city_query)
             
             if data and len(data) > 0:
                 result = {
@@ -108,32 +96,24 @@ class VenueGeocoder:
         self.cache[cache_key] = None
         return None
     
-    def geocode_events(self, events: List[Dict], day_filter: Optional[str] = None) -> Dict:
+    async def geocode_many(self, locations: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """Geocode many venue/city pairs concurrently under the shared rate limit"""
+        return await self.nominatim.geocode_many(self.geocode_location_async, locations)
+    
+    async def geocode_events(self, events: List[Dict], day_filter: Optional[str] = None) -> Dict:
         """Geocode all venues from events list"""
         # Filter by day if specified
         if day_filter:
+            by_weekday = group_by_weekday(events)
             if day_filter.lower() == 'friday':
-                events = [e for e in events 
-                         if datetime.datetime.strptime(e['dateISO'], '%Y-%m-%d').weekday() == 4]
+                events = by_weekday[4]
                 print(f"🎯 Filtering for Friday events: {len(events)} events")
             elif day_filter.lower() == 'weekend':
-                events = [e for e in events 
-                         if datetime.datetime.strptime(e['dateISO'], '%Y-%m-%d').weekday() in [4, 5, 6]]
+                events = by_weekday[4] + by_weekday[5] + by_weekday[6]
                 print(f"🎯 Filtering for weekend events: {len(events)} events")
         
         # Get unique venues
-        unique_venues = {}
-        for event in events:
-            if event.get('hidden'):
-                continue
-            key = f"{event['venue']}|{event['city']}"
-            if key not in unique_venues:
-                unique_venues[key] = {
-                    'venue': event['venue'],
-                    'city': event['city'],
-                    'events': []
-                }
-            unique_venues[key]['events'].append(event)
+        unique_venues = group_by_venue(events)
         
         print(f"📍 Found {len(unique_venues)} unique venues to geocode")
         
@@ -145,131 +125,117 @@ class VenueGeocoder:
             'events_with_coords': []
         }
         
-        for i, (key, venue_info) in enumerate(unique_venues.items(), 1):
-            venue = venue_info['venue']
-            city = venue_info['city']
-            
+        for i, (venue, city) in enumerate(unique_venues, 1):
             print(f"[{i}/{len(unique_venues)}] Geocoding: {venue}, {city}")
-            
-            location = self.geocode_location(venue, city)
-            
+        
+        locations = await self.geocode_many(list(unique_venues))
+        
+        for ((venue, city), venue_events), location in zip(unique_venues.items(), locations):
             if location:
                 results['successful'] += 1
                 if location.get('approximate'):
                     results['approximate'] += 1
                 
-                # Add coordinates to all events at this venue
-                for event in venue_info['events']:
-                    event_with_coords = event.copy()
-                    event_with_coords['coordinates'] = {
-                        'lat': location['lat'],
-                        'lon': location['lon'],
-                        'display_name': location['display_name'],
-                        'approximate': location.get('approximate', False)
-                    }
-                    results['events_with_coords'].append(event_with_coords)
+                # One coordinates dict per venue, shared by all of its events
+                coords = {
+                    'lat': location['lat'],
+                    'lon': location['lon'],
+                    'display_name': location['display_name'],
+                    'approximate': location.get('approximate', False)
+                }
+                for event in venue_events:
+                    event['coordinates'] = coords
+                    results['events_with_coords'].append(event)
             else:
                 results['failed'] += 1
                 print(f"   ❌ Failed to geocode: {venue}, {city}")
-            
-            # Save cache periodically
-            if i % 10 == 0:
-                self.save_cache()
-        
-        # Final save
-        self.save_cache()
         
         return results
 
-def geocode_day(geocoder, all_events, day_name, weekday_num):
-    """Geocode events for a specific day"""
-    # Filter events for this day
-    day_events = [e for e in all_events 
-                  if datetime.datetime.strptime(e['dateISO'], '%Y-%m-%d').weekday() == weekday_num]
+async def geocode_all_days(geocoder, by_weekday, days: Dict[str, int]) -> Dict[str, Dict]:
+    """Geocode several days in one batch and write one output file per day
     
-    print(f"\n🗺️  Geocoding {day_name} events...")
-    print(f"📅 Found {len(day_events)} {day_name} events")
+    Venues active on more than one day are looked up once, then the results
+    are fanned back out to each day's events.
+    """
+    day_venues = {}
+    for day_name, weekday_num in days.items():
+        day_events = by_weekday[weekday_num]
+        print(f"\n🗺️  Geocoding {day_name} events...")
+        print(f"📅 Found {len(day_events)} {day_name} events")
+        
+        # Get unique venues for this day
+        day_venues[day_name] = group_by_venue(day_events)
+        print(f"📍 {len(day_venues[day_name])} unique venues for {day_name}")
     
-    # Get unique venues for this day
-    unique_venues = {}
-    for event in day_events:
-        if event.get('hidden'):
-            continue
-        key = f"{event['venue']}|{event['city']}"
-        if key not in unique_venues:
-            unique_venues[key] = {
-                'venue': event['venue'],
-                'city': event['city'],
-                'events': []
-            }
-        unique_venues[key]['events'].append(event)
+    # Geocode the union of all days' venues in a single batch
+    all_venues = list(dict.fromkeys(pair for venues in day_venues.values() for pair in venues))
+    print(f"\n📍 {len(all_venues)} unique venues across {', '.join(days)}")
     
-    print(f"📍 {len(unique_venues)} unique venues for {day_name}")
+    for i, (venue, city) in enumerate(all_venues, 1):
+        print(f"[{i}/{len(all_venues)}] Geocoding: {venue}, {city}")
     
-    # Geocode
-    results = {
-        'successful': 0,
-        'failed': 0,
-        'approximate': 0,
-        'events_with_coords': []
-    }
+    locations = dict(zip(all_venues, await geocoder.geocode_many(all_venues)))
     
-    for i, (key, venue_info) in enumerate(unique_venues.items(), 1):
-        venue = venue_info['venue']
-        city = venue_info['city']
-        
-        print(f"[{day_name} {i}/{len(unique_venues)}] Geocoding: {venue}, {city}")
-        
-        location = geocoder.geocode_location(venue, city)
+    all_results = {}
+    for day_name, unique_venues in day_venues.items():
+        results = {
+            'successful': 0,
+            'failed': 0,
+            'approximate': 0,
+            'events_with_coords': []
+        }
         
-        if location:
-            results['successful'] += 1
-            if location.get('approximate'):
-                results['approximate'] += 1
-            
-            # Add coordinates to all events at this venue
-            for event in venue_info['events']:
-                event_with_coords = event.copy()
-                event_with_coords['coordinates'] = {
+        for (venue, city), venue_events in unique_venues.items():
+            location = locations[(venue, city)]
+            if location:
+                results['successful'] += 1
+                if location.get('approximate'):
+                    results['approximate'] += 1
+                
+                # One coordinates dict per venue, shared by all of its events
+                coords = {
                     'lat': location['lat'],
                     'lon': location['lon'],
                     'display_name': location['display_name'],
                     'approximate': location.get('approximate', False)
                 }
-                results['events_with_coords'].append(event_with_coords)
-        else:
-            results['failed'] += 1
-            print(f"   ❌ Failed to geocode: {venue}, {city}")
+                for event in venue_events:
+                    event['coordinates'] = coords
+                    results['events_with_coords'].append(event)
+            else:
+                results['failed'] += 1
+                print(f"   ❌ Failed to geocode: {venue}, {city}")
         
-        # Save cache periodically
-        if i % 10 == 0:
-            geocoder.save_cache()
-    
-    # Save results to file
-    output_file = f'events_{day_name.lower()}_geocoded.json'
-    with open(output_file, 'w') as f:
-        json.dump(results['events_with_coords'], f, indent=2)
+        # Save results to file
+        output_file = f'events_{day_name.lower()}_geocoded.json'
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(results['events_with_coords'], option=orjson.OPT_INDENT_2))
+        
+        print(f"\n✅ {day_name} complete: {len(results['events_with_coords'])} events saved to {output_file}")
+        all_results[day_name] = results
     
-    print(f"\n✅ {day_name} complete: {len(results['events_with_coords'])} events saved to {output_file}")
-    return results
+    return all_results
 
-def main():
+async def main():
     # Load all events
     print("📂 Loading events...")
-    with open('events-2025-08-29T19-48-28.json', 'r') as f:
-        all_events = json.load(f)
+    with open('events-2025-08-29T19-48-28.json', 'rb') as f:
+        all_events = orjson.loads(f.read())
+    
+    # Parse each date once and bucket events by weekday
+    by_weekday = group_by_weekday(all_events)
     
     # Initialize geocoder
     geocoder = VenueGeocoder()
     
-    # Geocode Friday events (weekday 4)
-    friday_results = geocode_day(geocoder, all_events, 'Friday', 4)
-    
-    # Geocode Saturday events (weekday 5)
-    saturday_results = geocode_day(geocoder, all_events, 'Saturday', 5)
+    # Geocode Friday (weekday 4) and Saturday (weekday 5) events in one batch
+    day_results = await geocode_all_days(geocoder, by_weekday, {'Friday': 4, 'Saturday': 5})
+    friday_results = day_results['Friday']
+    saturday_results = day_results['Saturday']
     
-    # Final save of cache
-    geocoder.save_cache()
+    # Results are persisted as they arrive; just release the cache
+    geocoder.cache.close()
     
     # Print summary
     print("\n" + "="*50)
@@ -288,7 +254,7 @@ def main():
     print(f"\n📁 Output files:")
     print(f"   • Friday events: events_friday_geocoded.json")
     print(f"   • Saturday events: events_saturday_geocoded.json")
-    print(f"   • Geocode cache: geocode_cache.json")
+    print(f"   • Geocode cache: {geocoder.cache_file}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -3,19 +3,41 @@
 Migrate JSON events data to SQLite database
 """
 
-import json
-import re
-from datetime import datetime
+import mmap
+import sys
+from datetime import date
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Set
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import orjson
+from sqlalchemy import Index, func, select, text
+from sqlalchemy.exc import SQLAlchemyError
 from models import (
     Base, Event, Venue, Genre, Promoter, EventLink, TBAVenueHint,
-    create_database, get_session
+    event_genres, event_promoters, create_database, get_session, pack_original_json,
+    rebuild_search_index, refresh_name_stats
 )
 
+# Events transformed between bulk inserts; bounds the queued rows in memory
+BATCH_SIZE = 2000
+
+
+def load_json(path: str):
+    """Parse a JSON file with orjson straight from a read-only memory map"""
+    with open(path, 'rb') as f:
+        if Path(path).stat().st_size == 0:
+            return orjson.loads(b'')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return orjson.loads(memoryview(mapped))
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso(date_str: str) -> date:
+    """Parse a YYYY-MM-DD string; events share few distinct dates, so cache it"""
+    return date.fromisoformat(date_str)
+
 
 class EventMigrator:
     """Migrate JSON events to SQLite database"""
@@ -25,10 +47,21 @@ class EventMigrator:
         self.engine = create_database(db_path)
         self.session = get_session(self.engine)
         
-        # Cache for deduplication
-        self.venue_cache: Dict[str, Venue] = {}
-        self.genre_cache: Dict[str, Genre] = {}
-        self.promoter_cache: Dict[str, Promoter] = {}
+        # Id caches for deduplication
+        self.venue_cache: Dict[str, int] = {}
+        self.genre_cache: Dict[str, int] = {}
+        self.promoter_cache: Dict[str, int] = {}
+        self.tba_venue_ids: Set[int] = set()
+        
+        # Warm the caches up front so lookups never hit the database per row
+        self.load_ids()
+        
+        # Plain row dicts waiting to be bulk-inserted
+        self.event_rows: List[dict] = []
+        self.event_genre_rows: List[dict] = []
+        self.event_promoter_rows: List[dict] = []
+        self.link_rows: List[dict] = []
+        self.tba_hint_rows: List[dict] = []
         
         # Statistics
         self.stats = {
@@ -40,205 +73,249 @@ class EventMigrator:
             'errors': []
         }
     
-    def get_or_create_venue(self, venue_name: str, city: str, coordinates: Optional[dict] = None) -> Venue:
-        """Get existing venue or create new one"""
-        # Create cache key
-        cache_key = f"{venue_name}|{city}"
-        
-        # Check cache first
-        if cache_key in self.venue_cache:
-            return self.venue_cache[cache_key]
-        
-        # Check if it's a TBA venue
-        is_tba = bool(venue_name and re.search(r'TBA|TBD', venue_name, re.I))
-        
-        # Query database
-        venue = self.session.query(Venue).filter(
-            Venue.name == venue_name,
-            Venue.city == city
-        ).first()
-        
-        if not venue:
-            # Create new venue
-            venue = Venue(
-                name=venue_name,
-                city=city,
-                is_tba=is_tba
-            )
-            
-            # Add coordinates if available
-            if coordinates:
-                venue.latitude = coordinates.get('lat')
-                venue.longitude = coordinates.get('lon')
-                venue.display_name = coordinates.get('display_name')
-                venue.is_approximate = coordinates.get('approximate', False)
-            
-            self.session.add(venue)
-            self.session.flush()  # Get the ID without committing
-            self.stats['venues_created'] += 1
-            
+    def load_ids(self):
+        """Fill the id caches with one SELECT per lookup table"""
+        for venue_id, name, city, is_tba in self.session.execute(
+            select(Venue.id, Venue.name, Venue.city, Venue.is_tba)
+        ):
+            self.venue_cache[sys.intern(f"{name}|{city}")] = venue_id
             if is_tba:
-                self.stats['tba_venues'] += 1
+                self.tba_venue_ids.add(venue_id)
         
-        # Cache it
-        self.venue_cache[cache_key] = venue
-        return venue
-    
-    def get_or_create_genre(self, genre_name: str) -> Genre:
-        """Get existing genre or create new one"""
-        # Check cache first
-        if genre_name in self.genre_cache:
-            return self.genre_cache[genre_name]
-        
-        # Query database
-        genre = self.session.query(Genre).filter(Genre.name == genre_name).first()
-        
-        if not genre:
-            # Create new genre
-            genre = Genre(name=genre_name)
-            self.session.add(genre)
-            self.session.flush()
-            self.stats['genres_created'] += 1
-        
-        # Cache it
-        self.genre_cache[genre_name] = genre
-        return genre
+        # Genre and promoter names are unique case-insensitively (NOCASE)
+        for genre_id, name in self.session.execute(select(Genre.id, Genre.name)):
+            self.genre_cache[sys.intern(name.lower())] = genre_id
+        
+        for promoter_id, name in self.session.execute(select(Promoter.id, Promoter.name)):
+            self.promoter_cache[sys.intern(name.lower())] = promoter_id
     
-    def get_or_create_promoter(self, promoter_name: str) -> Promoter:
-        """Get existing promoter or create new one"""
-        # Check cache first
-        if promoter_name in self.promoter_cache:
-            return self.promoter_cache[promoter_name]
-        
-        # Query database
-        promoter = self.session.query(Promoter).filter(Promoter.name == promoter_name).first()
-        
-        if not promoter:
-            # Create new promoter
-            promoter = Promoter(name=promoter_name)
-            self.session.add(promoter)
-            self.session.flush()
-            self.stats['promoters_created'] += 1
-        
-        # Cache it
-        self.promoter_cache[promoter_name] = promoter
-        return promoter
+    def create_lookups(self, all_events: List[dict]):
+        """Pass 1: bulk-insert every venue, genre and promoter not yet in the database"""
+        new_venues: Dict[str, dict] = {}
+        new_genres: Dict[str, dict] = {}
+        new_promoters: Dict[str, dict] = {}
+        
+        for event_data in all_events:
+            venue_name = event_data.get('venue')
+            if venue_name:
+                city = event_data.get('city', '')
+                cache_key = sys.intern(f"{venue_name}|{city}")
+                if cache_key not in self.venue_cache and cache_key not in new_venues:
+                    coordinates = event_data.get('coordinates') or {}
+                    upper_name = venue_name.upper()
+                    new_venues[cache_key] = {
+                        'name': venue_name,
+                        'city': city,
+                        'latitude': coordinates.get('lat'),
+                        'longitude': coordinates.get('lon'),
+                        'display_name': coordinates.get('display_name'),
+                        'is_approximate': coordinates.get('approximate', False),
+                        'is_tba': 'TBA' in upper_name or 'TBD' in upper_name
+                    }
+            
+            for genre_name in event_data.get('genres', []):
+                if genre_name:
+                    genre_key = genre_name.lower()
+                    if genre_key not in self.genre_cache and genre_key not in new_genres:
+                        new_genres[genre_key] = {'name': genre_name}
+            
+            for promoter_name in event_data.get('promoters', []):
+                if promoter_name:
+                    promoter_key = promoter_name.lower()
+                    if promoter_key not in self.promoter_cache and promoter_key not in new_promoters:
+                        new_promoters[promoter_key] = {'name': promoter_name}
+        
+        if new_venues:
+            self.session.execute(Venue.__table__.insert(), list(new_venues.values()))
+        if new_genres:
+            self.session.execute(Genre.__table__.insert(), list(new_genres.values()))
+        if new_promoters:
+            self.session.execute(Promoter.__table__.insert(), list(new_promoters.values()))
+        
+        self.stats['venues_created'] += len(new_venues)
+        self.stats['tba_venues'] += sum(1 for venue in new_venues.values() if venue['is_tba'])
+        self.stats['genres_created'] += len(new_genres)
+        self.stats['promoters_created'] += len(new_promoters)
+        
+        # Read the new ids back
+        self.load_ids()
     
-    def migrate_event(self, event_data: dict) -> Optional[Event]:
-        """Migrate a single event from JSON to database"""
+    def migrate_event(self, event_data: dict, event_id: int) -> bool:
+        """Pass 2: queue the rows for a single event under a pre-assigned id"""
+        # Bind the dict lookups used on every field once per event
+        get = event_data.get
         try:
             # Parse date
-            date_str = event_data.get('dateISO')
+            date_str = get('dateISO')
             event_date = None
             if date_str:
                 try:
-                    event_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                    event_date = _parse_iso(date_str)
                 except ValueError:
                     print(f"Warning: Invalid date format: {date_str}")
             
-            # Get or create venue
-            venue = None
-            if event_data.get('venue'):
-                venue = self.get_or_create_venue(
-                    event_data['venue'],
-                    event_data.get('city', ''),
-                    event_data.get('coordinates')
-                )
+            # Look up venue id
+            venue_id = None
+            venue_name = get('venue')
+            if venue_name:
+                venue_id = self.venue_cache[f"{venue_name}|{get('city', '')}"]
             
-            # Create event
-            event = Event(
-                title=event_data.get('title', 'Untitled Event'),
-                url=event_data.get('url'),
-                hidden=event_data.get('hidden', False),
-                date=event_date,
-                day_label=event_data.get('dayLabel'),
-                time_range=event_data.get('timeRange'),
-                venue=venue,
-                price=event_data.get('price'),
-                age_restriction=event_data.get('age'),
-                original_json=json.dumps(event_data),
-                source='19hz'
-            )
+            event_row = {
+                'id': event_id,
+                'title': get('title', 'Untitled Event'),
+                'url': get('url'),
+                'hidden': get('hidden', False),
+                'date': event_date,
+                'day_label': get('dayLabel'),
+                'time_range': get('timeRange'),
+                'venue_id': venue_id,
+                'price': get('price'),
+                'age_restriction': get('age'),
+                'original_json': pack_original_json(event_data),
+                'source': '19hz'
+            }
             
-            # Add genres (deduplicate first)
-            unique_genres = set(event_data.get('genres', []))
-            for genre_name in unique_genres:
-                if genre_name:
-                    genre = self.get_or_create_genre(genre_name)
-                    if genre not in event.genres:  # Avoid duplicates
-                        event.genres.append(genre)
+            # Add genres (deduplicated by id; names differing only in case share a row)
+            genre_cache = self.genre_cache
+            genre_rows = [
+                {'event_id': event_id, 'genre_id': genre_id}
+                for genre_id in dict.fromkeys(
+                    genre_cache[genre_name.lower()]
+                    for genre_name in get('genres', ()) if genre_name
+                )
+            ]
             
-            # Add promoters
-            for promoter_name in event_data.get('promoters', []):
-                if promoter_name:
-                    promoter = self.get_or_create_promoter(promoter_name)
-                    event.promoters.append(promoter)
+            # Add promoters (deduplicated too, the association has a composite key)
+            promoter_cache = self.promoter_cache
+            promoter_rows = [
+                {'event_id': event_id, 'promoter_id': promoter_id}
+                for promoter_id in dict.fromkeys(
+                    promoter_cache[promoter_name.lower()]
+                    for promoter_name in get('promoters', ()) if promoter_name
+                )
+            ]
             
             # Add extra links
-            for link_data in event_data.get('extraLinks', []):
-                if link_data.get('href'):
-                    link = EventLink(
-                        text=link_data.get('text', ''),
-                        href=link_data['href']
-                    )
-                    event.extra_links.append(link)
+            link_rows = [
+                {'event_id': event_id, 'text': link_data.get('text', ''), 'href': link_data['href']}
+                for link_data in get('extraLinks', ()) if link_data.get('href')
+            ]
             
             # Add TBA venue hints if it's a TBA venue
-            if venue and venue.is_tba and event_data.get('venue_hints'):
-                for hint in event_data['venue_hints']:
-                    tba_hint = TBAVenueHint(
-                        event_id=event.id,
-                        hint_type=hint.get('type'),
-                        hint_text=hint.get('text'),
-                        confidence=hint.get('confidence', 'low')
-                    )
-                    self.session.add(tba_hint)
+            hint_rows = ()
+            if venue_id in self.tba_venue_ids and get('venue_hints'):
+                hint_rows = [
+                    {
+                        'event_id': event_id,
+                        'hint_type': hint.get('type'),
+                        'hint_text': hint.get('text'),
+                        'confidence': hint.get('confidence', 'low')
+                    }
+                    for hint in event_data['venue_hints']
+                ]
             
-            self.session.add(event)
+            # Queue only once every row for the event was built
+            self.event_rows.append(event_row)
+            self.event_genre_rows.extend(genre_rows)
+            self.event_promoter_rows.extend(promoter_rows)
+            self.link_rows.extend(link_rows)
+            self.tba_hint_rows.extend(hint_rows)
             self.stats['events_migrated'] += 1
             
-            return event
+            return True
             
         except Exception as e:
-            error_msg = f"Error migrating event '{event_data.get('title', 'Unknown')}': {e}"
+            error_msg = f"Error migrating event '{get('title', 'Unknown')}': {e}"
             print(f"❌ {error_msg}")
             self.stats['errors'].append(error_msg)
-            return None
+            return False
+    
+    @staticmethod
+    def bulk_indexes() -> List[Index]:
+        """Non-unique indexes that are cheaper to rebuild than to maintain per row"""
+        return [
+            index
+            for table in Base.metadata.sorted_tables
+            for index in table.indexes
+            if not index.unique
+        ]
+    
+    def insert_rows(self):
+        """Bulk-insert all queued rows, one executemany per table
+        
+        Each batch runs under its own SAVEPOINT inside the migration's single
+        transaction, so a bad batch is rolled back on its own.
+        """
+        batches = (
+            (Event.__table__, self.event_rows),
+            (event_genres, self.event_genre_rows),
+            (event_promoters, self.event_promoter_rows),
+            (EventLink.__table__, self.link_rows),
+            (TBAVenueHint.__table__, self.tba_hint_rows),
+        )
+        try:
+            with self.session.begin_nested():
+                for table, rows in batches:
+                    if rows:
+                        self.session.execute(table.insert(), rows)
+        except SQLAlchemyError as e:
+            error_msg = f"Rolled back a batch of {len(self.event_rows)} events: {getattr(e, 'orig', e)}"
+            print(f"❌ {error_msg}")
+            self.stats['errors'].append(error_msg)
+            self.stats['events_migrated'] -= len(self.event_rows)
+        finally:
+            for _, rows in batches:
+                rows.clear()
     
     def migrate_from_file(self, json_file: str):
         """Migrate events from a JSON file"""
         print(f"📂 Loading events from {json_file}...")
         
-        with open(json_file, 'r') as f:
-            if 'organized' in json_file:
-                # Handle organized format
-                data = json.load(f)
-                all_events = []
-                for date_events in data.get('events_by_date', {}).values():
-                    all_events.extend(date_events)
-            else:
-                # Handle regular array format
-                all_events = json.load(f)
+        data = load_json(json_file)
+        if 'organized' in json_file:
+            # Handle organized format
+            all_events = list(chain.from_iterable(data.get('events_by_date', {}).values()))
+        else:
+            # Handle regular array format
+            all_events = data
         
         print(f"📊 Found {len(all_events)} events to migrate")
         
-        # Migrate each event
-        for i, event_data in enumerate(all_events, 1):
-            if i % 50 == 0:
-                print(f"  Processing event {i}/{len(all_events)}...")
-                try:
-                    self.session.commit()  # Commit in batches
-                except Exception as e:
-                    print(f"⚠️  Commit failed, rolling back: {e}")
-                    self.session.rollback()
+        try:
+            # Drop secondary indexes for the load and rebuild each once at the end
+            connection = self.session.connection()
+            indexes = self.bulk_indexes()
+            for index in indexes:
+                index.drop(connection, checkfirst=True)
+            
+            # Pass 1: make sure every venue, genre and promoter has an id
+            self.create_lookups(all_events)
+            
+            # Pass 2: build plain rows with event ids assigned up front, handing
+            # each batch to SQLite before transforming the next one
+            next_id = (self.session.execute(select(func.max(Event.id))).scalar() or 0) + 1
+            for i, event_data in enumerate(all_events, 1):
+                if i % 50 == 0:
+                    print(f"  Processing event {i}/{len(all_events)}...")
+                if self.migrate_event(event_data, next_id):
+                    next_id += 1
+                if i % BATCH_SIZE == 0:
+                    self.insert_rows()
             
-            try:
-                self.migrate_event(event_data)
-            except Exception as e:
-                print(f"⚠️  Error on event {i}, rolling back: {e}")
-                self.session.rollback()
+            # Insert the remainder, restore the indexes and commit once
+            self.insert_rows()
+            for index in indexes:
+                index.create(connection, checkfirst=True)
+            rebuild_search_index(self.session)
+            refresh_name_stats(self.session)
+            self.session.commit()
+        except Exception as e:
+            print(f"⚠️  Bulk insert failed, rolling back: {e}")
+            self.session.rollback()
+            raise
         
-        # Final commit
+        # Refresh planner statistics for the freshly loaded tables
+        self.session.execute(text("ANALYZE"))
         self.session.commit()
         
         print("\n✅ Migration complete!")
@@ -251,36 +328,42 @@ class EventMigrator:
         
         print(f"\n📂 Loading TBA hints from {tba_file}...")
         
-        with open(tba_file, 'r') as f:
-            data = json.load(f)
+        data = load_json(tba_file)
         
         tba_events = data.get('events', [])
         
+        # Index events by (title, date) and existing hints with one query each
+        event_ids = {}
+        for event_id, title, event_date in self.session.execute(
+            select(Event.id, Event.title, Event.date).order_by(Event.id)
+        ):
+            event_ids.setdefault((title, event_date), event_id)
+        
+        existing_hints = set(self.session.execute(
+            select(TBAVenueHint.event_id, TBAVenueHint.hint_type, TBAVenueHint.hint_text)
+        ).tuples())
+        
+        new_hints = []
         for event_data in tba_events:
             # Find matching event by title and date
-            event = self.session.query(Event).filter(
-                Event.title == event_data.get('title'),
-                Event.date == datetime.strptime(event_data['dateISO'], '%Y-%m-%d').date() if event_data.get('dateISO') else None
-            ).first()
+            event_date = _parse_iso(event_data['dateISO']) if event_data.get('dateISO') else None
+            event_id = event_ids.get((event_data.get('title'), event_date))
             
-            if event and event_data.get('venue_hints'):
+            if event_id and event_data.get('venue_hints'):
                 for hint in event_data['venue_hints']:
-                    # Check if hint already exists
-                    existing = self.session.query(TBAVenueHint).filter(
-                        TBAVenueHint.event_id == event.id,
-                        TBAVenueHint.hint_type == hint.get('type'),
-                        TBAVenueHint.hint_text == hint.get('text')
-                    ).first()
-                    
-                    if not existing:
-                        tba_hint = TBAVenueHint(
-                            event_id=event.id,
-                            hint_type=hint.get('type'),
-                            hint_text=hint.get('text'),
-                            confidence='low'
-                        )
-                        self.session.add(tba_hint)
-        
+                    # Skip hints that already exist
+                    hint_key = (event_id, hint.get('type'), hint.get('text'))
+                    if hint_key not in existing_hints:
+                        existing_hints.add(hint_key)
+                        new_hints.append({
+                            'event_id': event_id,
+                            'hint_type': hint.get('type'),
+                            'hint_text': hint.get('text'),
+                            'confidence': 'low'
+                        })
+        
+        if new_hints:
+            self.session.execute(TBAVenueHint.__table__.insert(), new_hints)
         self.session.commit()
         print("✅ TBA hints migrated")
     
@@ -304,11 +387,14 @@ class EventMigrator:
         """Verify the migration was successful"""
         print("\n🔍 Verifying migration...")
         
-        total_events = self.session.query(Event).count()
-        total_venues = self.session.query(Venue).count()
-        total_genres = self.session.query(Genre).count()
-        total_promoters = self.session.query(Promoter).count()
-        tba_venues = self.session.query(Venue).filter(Venue.is_tba == True).count()
+        # All five counts in a single round trip
+        total_events, total_venues, total_genres, total_promoters, tba_venues = self.session.query(
+            self.session.query(func.count(Event.id)).scalar_subquery(),
+            self.session.query(func.count(Venue.id)).scalar_subquery(),
+            self.session.query(func.count(Genre.id)).scalar_subquery(),
+            self.session.query(func.count(Promoter.id)).scalar_subquery(),
+            self.session.query(func.count(Venue.id)).filter(Venue.is_tba == True).scalar_subquery()
+        ).one()
         
         print(f"  • Total events in DB: {total_events}")
         print(f"  • Total venues in DB: {total_venues}")
@@ -2,15 +2,33 @@
 SQLAlchemy database models for SF Events
 """
 
+import os
+import re
+import zlib
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, Table, Text
+import orjson
+from sqlalchemy import case, create_engine, event, text, Column, Index, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, LargeBinary, Table, Text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, Session, sessionmaker
+from sqlalchemy.orm import deferred, raiseload, relationship, selectinload, Session, sessionmaker
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+_SEARCH_TOKEN_RE = re.compile(r'\w+')
+
+# Full-text index over title, venue, genre and promoter names (rowid = event id)
+_CREATE_FTS_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5("
+    "title, venue, genres, promoters, tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+def pack_original_json(event_data: dict) -> bytes:
+    """Serialize and compress an event's source JSON for Event.original_json"""
+    return zlib.compress(orjson.dumps(event_data), 6)
+
+
 # Association tables for many-to-many relationships
 event_genres = Table(
     'event_genres',
@@ -30,6 +48,10 @@ event_promoters = Table(
 class Venue(Base):
     """Venue with location information"""
     __tablename__ = 'venues'
+    __table_args__ = (
+        Index('ix_venue_name_city', 'name', 'city', unique=True),
+        Index('ix_venues_city', 'city'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -57,7 +79,7 @@ class Genre(Base):
     __tablename__ = 'genres'
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), unique=True, nullable=False, index=True)
+    name = Column(String(100, collation='NOCASE'), unique=True, nullable=False, index=True)
     
     # Relationships
     events = relationship("Event", secondary=event_genres, back_populates="genres")
@@ -71,7 +93,7 @@ class Promoter(Base):
     __tablename__ = 'promoters'
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), unique=True, nullable=False, index=True)
+    name = Column(String(255, collation='NOCASE'), unique=True, nullable=False, index=True)
     
     # Relationships
     events = relationship("Event", secondary=event_promoters, back_populates="promoters")
@@ -83,6 +105,12 @@ class Promoter(Base):
 class Event(Base):
     """Main event table"""
     __tablename__ = 'events'
+    __table_args__ = (
+        # Every public listing filters hidden = 0 and then a date or date range
+        Index('ix_events_hidden_date', 'hidden', 'date'),
+        # Venue joins (TBA listings, per-venue counts) check hidden on the same entry
+        Index('ix_events_venue_hidden', 'venue_id', 'hidden'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -104,13 +132,20 @@ class Event(Base):
     price = Column(String(100))
     age_restriction = Column(String(50))
     
-    # Relationships
-    genres = relationship("Genre", secondary=event_genres, back_populates="events")
-    promoters = relationship("Promoter", secondary=event_promoters, back_populates="events")
-    extra_links = relationship("EventLink", back_populates="event", cascade="all, delete-orphan")
+    # Relationships; collections load in key order under any loader strategy
+    genres = relationship(
+        "Genre", secondary=event_genres, back_populates="events", order_by=event_genres.c.genre_id
+    )
+    promoters = relationship(
+        "Promoter", secondary=event_promoters, back_populates="events", order_by=event_promoters.c.promoter_id
+    )
+    extra_links = relationship(
+        "EventLink", back_populates="event", cascade="all, delete-orphan", order_by="EventLink.id"
+    )
+    tba_hints = relationship("TBAVenueHint", back_populates="event", order_by="TBAVenueHint.id")
     
     # Original data tracking
-    original_json = Column(Text)  # Store original JSON for reference
+    original_json = deferred(Column(LargeBinary))  # zlib-compressed source JSON, loaded on access
     source = Column(String(50))  # e.g., "19hz", "manual"
     
     # Timestamps
@@ -173,26 +208,202 @@ class TBAVenueHint(Base):
     confidence = Column(String(20))  # 'high', 'medium', 'low'
     
     # Relationships
-    event = relationship("Event")
+    event = relationship("Event", back_populates="tba_hints")
     
     def __repr__(self):
         return f"<TBAVenueHint(type='{self.hint_type}', text='{self.hint_text[:30]}...')>"
 
 
+class GenreStat(Base):
+    """Visible event count per genre, refreshed after each scrape"""
+    __tablename__ = 'genre_stats'
+    
+    name = Column(String(100, collation='NOCASE'), primary_key=True)
+    event_count = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<GenreStat(name='{self.name}', event_count={self.event_count})>"
+
+
+class PromoterStat(Base):
+    """Visible event count per promoter, refreshed after each scrape"""
+    __tablename__ = 'promoter_stats'
+    
+    name = Column(String(255, collation='NOCASE'), primary_key=True)
+    event_count = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<PromoterStat(name='{self.name}', event_count={self.event_count})>"
+
+
 # Database setup
+def sqlite_engine(url: str = "sqlite:///events.db", **kwargs):
+    """Create an engine whose connections all get the SQLite pragmas below"""
+    # Wait up to 30s (not the default 5s) for another writer's lock, e.g. a
+    # stats refresh landing while a scrape commits. File databases already get
+    # a QueuePool with check_same_thread off from SQLAlchemy 2.0's pysqlite dialect.
+    connect_args = {"timeout": 30, **kwargs.pop("connect_args", {})}
+    engine = create_engine(url, echo=False, connect_args=connect_args, **kwargs)
+    
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, _):
+        # WAL + NORMAL sync avoids an fsync per commit and lets readers run
+        # alongside the scraper's writes; bigger cache and mmap for reads
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-131072")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+    
+    return engine
+
+
+def _merge_duplicate_venues(conn) -> int:
+    """Fold venue rows sharing a (name, city) into the lowest id
+    
+    Databases created before ix_venue_name_city existed can hold such
+    duplicates, which would make building the unique index fail. Events of
+    the dropped rows move to the kept row, which also takes the best
+    coordinates among its duplicates if it has none. Returns the number of
+    rows removed.
+    """
+    conn.execute(text("""
+        CREATE TEMP TABLE venue_dupes AS
+        SELECT v.id AS id, k.keep AS keep
+        FROM venues v
+        JOIN (SELECT name, city, MIN(id) AS keep FROM venues
+              GROUP BY name, city HAVING COUNT(*) > 1) k
+          ON v.name = k.name AND v.city IS k.city
+        WHERE v.id != k.keep
+    """))
+    try:
+        conn.execute(text("""
+            UPDATE venues SET (latitude, longitude, display_name, is_approximate) = (
+                SELECT d.latitude, d.longitude, d.display_name, d.is_approximate
+                FROM venue_dupes x JOIN venues d ON d.id = x.id
+                WHERE x.keep = venues.id AND d.latitude IS NOT NULL
+                ORDER BY COALESCE(d.is_approximate, 0), d.id LIMIT 1
+            )
+            WHERE latitude IS NULL AND EXISTS (
+                SELECT 1 FROM venue_dupes x JOIN venues d ON d.id = x.id
+                WHERE x.keep = venues.id AND d.latitude IS NOT NULL
+            )
+        """))
+        conn.execute(text("""
+            UPDATE events SET venue_id = (SELECT keep FROM venue_dupes WHERE id = events.venue_id)
+            WHERE venue_id IN (SELECT id FROM venue_dupes)
+        """))
+        return conn.execute(text("DELETE FROM venues WHERE id IN (SELECT id FROM venue_dupes)")).rowcount
+    finally:
+        conn.execute(text("DROP TABLE venue_dupes"))
+
+
 def create_database(db_path: str = "events.db"):
-    """Create database and tables"""
-    engine = create_engine(f"sqlite:///{db_path}", echo=False)
+    """Create database and tables
+    
+    Existing databases are brought up to date in place: missing indexes are
+    added, after duplicate venues are merged so the unique (name, city)
+    index can be built. Column collations are only set when a table is
+    first created, so genre/promoter names in older databases stay
+    case-sensitive at the SQL level (the writers still dedupe them by
+    lowered name).
+    """
+    engine = sqlite_engine(f"sqlite:///{db_path}")
     Base.metadata.create_all(engine)
+    
+    with engine.begin() as conn:
+        existing = set(conn.execute(text("SELECT name FROM sqlite_master")).scalars())
+        if 'ix_venue_name_city' not in existing:
+            _merge_duplicate_venues(conn)
+        # An older database already has events, so a new search index is
+        # filled right away rather than waiting for the next scrape
+        if 'events_fts' not in existing:
+            rebuild_search_index(conn)
+        # create_all skips tables that already exist, so add any indexes
+        # declared after an older database was created
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
     return engine
 
 
+def schema_is_current(engine) -> bool:
+    """Whether every table and index declared here (and events_fts) already exists"""
+    with engine.connect() as conn:
+        existing = set(conn.execute(text("SELECT name FROM sqlite_master")).scalars())
+    tables = Base.metadata.sorted_tables
+    declared = {'events_fts'} | {table.name for table in tables}
+    declared.update(index.name for table in tables for index in table.indexes)
+    return declared <= existing
+
+
+def rebuild_search_index(session: Session) -> int:
+    """Repopulate the events_fts table from the events tables in one statement
+    
+    Works on a Session or a plain Connection. Returns the number of events
+    indexed, i.e. the events table's row count.
+    """
+    # Databases created without create_database() may not have the table yet
+    session.execute(text(_CREATE_FTS_SQL))
+    session.execute(text("DELETE FROM events_fts"))
+    return session.execute(text("""
+        INSERT INTO events_fts (rowid, title, venue, genres, promoters)
+        SELECT e.id, e.title, COALESCE(v.name, ''),
+               COALESCE((SELECT group_concat(g.name, ' ') FROM event_genres eg
+                         JOIN genres g ON g.id = eg.genre_id WHERE eg.event_id = e.id), ''),
+               COALESCE((SELECT group_concat(p.name, ' ') FROM event_promoters ep
+                         JOIN promoters p ON p.id = ep.promoter_id WHERE ep.event_id = e.id), '')
+        FROM events e LEFT JOIN venues v ON v.id = e.venue_id
+    """)).rowcount
+
+
+def refresh_name_stats(session: Session):
+    """Recount visible events per genre and per promoter into the stats tables"""
+    session.execute(text("DELETE FROM genre_stats"))
+    session.execute(text("""
+        INSERT INTO genre_stats (name, event_count)
+        SELECT g.name, count(e.id) FROM genres g
+        JOIN event_genres eg ON eg.genre_id = g.id
+        JOIN events e ON e.id = eg.event_id
+        WHERE e.hidden = 0 GROUP BY g.name
+    """))
+    session.execute(text("DELETE FROM promoter_stats"))
+    session.execute(text("""
+        INSERT INTO promoter_stats (name, event_count)
+        SELECT p.name, count(e.id) FROM promoters p
+        JOIN event_promoters ep ON ep.promoter_id = p.id
+        JOIN events e ON e.id = ep.event_id
+        WHERE e.hidden = 0 GROUP BY p.name
+    """))
+
+
+def fts_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression of quoted prefix terms"""
+    tokens = _SEARCH_TOKEN_RE.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens) if tokens else None
+
+
 def get_session(engine):
     """Get database session"""
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     return SessionLocal()
 
 
+# Eager loads for everything Event.to_dict touches, so lists cost a few IN queries
+EVENT_LOADS = (
+    selectinload(Event.venue),
+    selectinload(Event.genres),
+    selectinload(Event.promoters),
+    selectinload(Event.extra_links)
+)
+# In development, set SF_EVENTS_STRICT_LOAD so any relationship the options
+# above miss raises on access instead of lazily querying once per event
+if os.environ.get("SF_EVENTS_STRICT_LOAD"):
+    EVENT_LOADS += (raiseload('*'),)
+
+
 # Query helpers
 class EventQueries:
     """Common database queries for events"""
@@ -200,7 +411,7 @@ class EventQueries:
     @staticmethod
     def get_events_by_date(session: Session, date: Date) -> List[Event]:
         """Get all events for a specific date"""
-        return session.query(Event).filter(
+        return session.query(Event).options(*EVENT_LOADS).filter(
             Event.date == date,
             Event.hidden == False
         ).all()
@@ -208,7 +419,7 @@ class EventQueries:
     @staticmethod
     def get_events_by_date_range(session: Session, start_date: Date, end_date: Date) -> List[Event]:
         """Get events within a date range"""
-        return session.query(Event).filter(
+        return session.query(Event).options(*EVENT_LOADS).filter(
             Event.date >= start_date,
             Event.date <= end_date,
             Event.hidden == False
@@ -216,8 +427,8 @@ class EventQueries:
     
     @staticmethod
     def get_tba_events(session: Session) -> List[Event]:
-        """Get all TBA venue events"""
-        return session.query(Event).join(Venue).filter(
+        """Get all TBA venue events, with their venue hints loaded"""
+        return session.query(Event).options(*EVENT_LOADS, selectinload(Event.tba_hints)).join(Venue).filter(
             Venue.is_tba == True,
             Event.hidden == False
         ).all()
@@ -225,7 +436,7 @@ class EventQueries:
     @staticmethod
     def get_events_by_genre(session: Session, genre_name: str) -> List[Event]:
         """Get events by genre"""
-        return session.query(Event).join(Event.genres).filter(
+        return session.query(Event).options(*EVENT_LOADS).join(Event.genres).filter(
             Genre.name == genre_name,
             Event.hidden == False
         ).all()
@@ -233,7 +444,7 @@ class EventQueries:
     @staticmethod
     def get_events_by_venue(session: Session, venue_name: str) -> List[Event]:
         """Get events by venue"""
-        return session.query(Event).join(Venue).filter(
+        return session.query(Event).options(*EVENT_LOADS).join(Venue).filter(
             Venue.name == venue_name,
             Event.hidden == False
         ).all()
@@ -241,36 +452,54 @@ class EventQueries:
     @staticmethod
     def get_events_by_promoter(session: Session, promoter_name: str) -> List[Event]:
         """Get events by promoter"""
-        return session.query(Event).join(Event.promoters).filter(
+        return session.query(Event).options(*EVENT_LOADS).join(Event.promoters).filter(
             Promoter.name == promoter_name,
             Event.hidden == False
         ).all()
     
+    @staticmethod
+    def search_event_ids(session: Session, query: str, column: Optional[str] = None) -> List[int]:
+        """Ids of events matching query in the FTS index, optionally within one column"""
+        match = fts_query(query)
+        if not match:
+            return []
+        if column:
+            match = f"{column} : ({match})"
+        
+        return session.execute(
+            text("SELECT rowid FROM events_fts WHERE events_fts MATCH :q"), {"q": match}
+        ).scalars().all()
+    
     @staticmethod
     def search_events(session: Session, query: str) -> List[Event]:
-        """Search events by title, venue, or genre"""
-        search_term = f"%{query}%"
-        return session.query(Event).filter(
+        """Search events by title, venue, genre or promoter via the FTS index"""
+        event_ids = EventQueries.search_event_ids(session, query)
+        if not event_ids:
+            return []
+        
+        return session.query(Event).options(*EVENT_LOADS).filter(
+            Event.id.in_(event_ids),
             Event.hidden == False
-        ).filter(
-            (Event.title.ilike(search_term)) |
-            (Event.venue.has(Venue.name.ilike(search_term))) |
-            (Event.genres.any(Genre.name.ilike(search_term)))
         ).all()
     
     @staticmethod
     def get_stats(session: Session) -> dict:
         """Get database statistics"""
-        total_events = session.query(Event).count()
-        visible_events = session.query(Event).filter(Event.hidden == False).count()
-        total_venues = session.query(Venue).count()
-        tba_venues = session.query(Venue).filter(Venue.is_tba == True).count()
-        total_genres = session.query(Genre).count()
-        total_promoters = session.query(Promoter).count()
+        # One pass over events for the counts and the visible date range
+        total_events, visible_events, start, end = session.query(
+            func.count(Event.id),
+            func.coalesce(func.sum(case((Event.hidden == False, 1), else_=0)), 0),
+            func.min(case((Event.hidden == False, Event.date))),
+            func.max(case((Event.hidden == False, Event.date)))
+        ).one()
         
-        # Get date range
-        dates = session.query(Event.date).filter(Event.hidden == False).all()
-        date_list = [d[0] for d in dates if d[0]]
+        # And one round trip for the lookup tables
+        total_venues, tba_venues, total_genres, total_promoters = session.query(
+            session.query(func.count(Venue.id)).scalar_subquery(),
+            session.query(func.count(Venue.id)).filter(Venue.is_tba == True).scalar_subquery(),
+            session.query(func.count(Genre.id)).scalar_subquery(),
+            session.query(func.count(Promoter.id)).scalar_subquery()
+        ).one()
         
         return {
             'total_events': total_events,
@@ -280,7 +509,7 @@ class EventQueries:
             'total_genres': total_genres,
             'total_promoters': total_promoters,
             'date_range': {
-                'start': min(date_list).isoformat() if date_list else None,
-                'end': max(date_list).isoformat() if date_list else None
+                'start': start.isoformat() if start else None,
+                'end': end.isoformat() if end else None
             }
         }
\ No newline at end of file
@@ -3,72 +3,156 @@
 Organize events by calendar date and create date-based JSON files
 """
 
-import json
+import hashlib
+import orjson
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
 from datetime import datetime, timedelta
 from collections import defaultdict
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
+
+_DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
 
 def load_all_events():
     """Load the geocoded events"""
     geocoded_file = Path("events_all_geocoded.json")
     if geocoded_file.exists():
-        with open(geocoded_file, 'r') as f:
-            return json.load(f)
+        with open(geocoded_file, 'rb') as f:
+            return orjson.loads(f.read())
     return []
 
-def organize_by_date(events: List[Dict[str, Any]]):
-    """Organize events by calendar date"""
-    events_by_date = defaultdict(list)
+@lru_cache(maxsize=4096)
+def _is_tba(venue: str) -> bool:
+    """Whether a venue name is a TBA placeholder (venues repeat, so memoized)"""
+    return 'TBA' in venue.upper()
+
+@lru_cache(maxsize=1024)
+def _neighborhood_hint(genres: Tuple[str, ...]):
+    """Neighborhood hint for a genre list (genre lists repeat, so memoized)"""
+    genres_lower = [g.lower() for g in genres]
+    neighborhoods = []
     
-    for event in events:
-        if event.get('dateISO'):
-            date = event['dateISO']
-            events_by_date[date].append(event)
+    if any('techno' in g or 'house' in g for g in genres_lower):
+        neighborhoods.append('SOMA')
+    if any('latin' in g or 'reggaeton' in g for g in genres_lower):
+        neighborhoods.append('Mission')
+    if any('underground' in g or 'warehouse' in g for g in genres_lower):
+        neighborhoods.extend(['SOMA', 'Dogpatch'])
+    
+    if not neighborhoods:
+        return None
+    
+    unique_neighborhoods = list(dict.fromkeys(neighborhoods))
+    return {
+        'type': 'neighborhood',
+        'text': f"Likely in {', '.join(unique_neighborhoods)}"
+    }
+
+def make_tba_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a TBA event and attach venue resolution hints"""
+    tba_event = event.copy()
+    tba_event['is_tba'] = True
+    
+    # Add resolution hints
+    hints = []
     
-    return dict(sorted(events_by_date.items()))
+    # Check if there's a promoter with known venues
+    if event.get('promoters'):
+        hints.append({
+            'type': 'promoter_history',
+            'text': f"Check {', '.join(event['promoters'][:2])} usual venues"
+        })
+    
+    # Check if venue might be in title
+    title = event.get('title', '')
+    if '@' in title or ':' in title:
+        hints.append({
+            'type': 'title_hint',
+            'text': 'Venue name might be in event title'
+        })
+    
+    # Suggest likely neighborhoods based on genre
+    if event.get('genres'):
+        neighborhood = _neighborhood_hint(tuple(event['genres']))
+        if neighborhood:
+            hints.append(neighborhood)
+    
+    tba_event['venue_hints'] = hints
+    return tba_event
 
-def get_date_metadata(events_by_date: Dict[str, List[Dict]]):
-    """Get metadata about the date range and available filters"""
-    all_cities = set()
-    all_genres = set()
+def process_events(events: List[Dict[str, Any]]):
+    """Bucket events by date and gather metadata, TBA events and the date index in one pass
+    
+    Returns (events_by_date, metadata, tba_events, index).
+    """
+    events_by_date = defaultdict(list)
     all_venues = set()
     all_promoters = set()
-    date_range = {
-        'start': None,
-        'end': None,
-        'dates': []
-    }
+    day_stats = defaultdict(lambda: {'visible': 0, 'tba': 0, 'cities': set(), 'genres': set()})
+    tba_events = []
+    
+    # Bind the hot method lookups once so the loop body is plain local access
+    add_venue = all_venues.add
+    add_promoters = all_promoters.update
+    add_tba = tba_events.append
     
-    for date, date_events in events_by_date.items():
-        date_range['dates'].append(date)
+    for event in events:
+        get = event.get
+        date = get('dateISO')
+        if not date:
+            continue
+        events_by_date[date].append(event)
+        stats = day_stats[date]
+        
+        venue = get('venue')
+        is_tba = bool(venue) and _is_tba(venue)
+        if is_tba:
+            add_tba(make_tba_event(event))
         
-        for event in date_events:
-            if not event.get('hidden'):
-                if event.get('city'):
-                    all_cities.add(event['city'])
-                if event.get('venue'):
-                    all_venues.add(event['venue'])
-                if event.get('genres'):
-                    all_genres.update(event['genres'])
-                if event.get('promoters'):
-                    all_promoters.update(event['promoters'])
-    
-    date_range['dates'].sort()
-    if date_range['dates']:
-        date_range['start'] = date_range['dates'][0]
-        date_range['end'] = date_range['dates'][-1]
+        if get('hidden'):
+            continue
+        
+        stats['visible'] += 1
+        if is_tba:
+            stats['tba'] += 1
+        city = get('city')
+        if city:
+            stats['cities'].add(city)
+        if venue:
+            add_venue(venue)
+        genres = get('genres')
+        if genres:
+            stats['genres'].update(genres)
+        promoters = get('promoters')
+        if promoters:
+            add_promoters(promoters)
     
-    return {
-        'date_range': date_range,
+    # Sort once at the end; the stable sort keeps input order within a date
+    events_by_date = dict(sorted(events_by_date.items()))
+    tba_events.sort(key=lambda e: e['dateISO'])
+    dates = list(events_by_date)
+    
+    # Overall cities and genres are the union of the per-date sets
+    all_cities = set(chain.from_iterable(stats['cities'] for stats in day_stats.values()))
+    all_genres = set(chain.from_iterable(stats['genres'] for stats in day_stats.values()))
+    
+    metadata = {
+        'date_range': {
+            'start': dates[0] if dates else None,
+            'end': dates[-1] if dates else None,
+            'dates': dates
+        },
         'available_filters': {
-            'cities': sorted(list(all_cities)),
-            'genres': sorted(list(all_genres)),
-            'venues': sorted(list(all_venues)),
-            'promoters': sorted(list(all_promoters))
+            'cities': sorted(all_cities),
+            'genres': sorted(all_genres),
+            'venues': sorted(all_venues),
+            'promoters': sorted(all_promoters)
         },
         'statistics': {
-            'total_dates': len(date_range['dates']),
+            'total_dates': len(dates),
             'total_events': sum(len(events) for events in events_by_date.values()),
             'unique_cities': len(all_cities),
             'unique_genres': len(all_genres),
@@ -76,117 +160,103 @@ def get_date_metadata(events_by_date: Dict[str, List[Dict]]):
             'unique_promoters': len(all_promoters)
         }
     }
-
-def identify_tba_events(events: List[Dict[str, Any]]):
-    """Identify and categorize TBA events"""
-    tba_events = []
     
-    for event in events:
-        if event.get('venue') and 'TBA' in event['venue'].upper():
-            tba_event = event.copy()
-            tba_event['is_tba'] = True
-            
-            # Add resolution hints
-            hints = []
-            
-            # Check if there's a promoter with known venues
-            if event.get('promoters'):
-                hints.append({
-                    'type': 'promoter_history',
-                    'text': f"Check {', '.join(event['promoters'][:2])} usual venues"
-                })
-            
-            # Check if venue might be in title
-            title = event.get('title', '')
-            if '@' in title or ':' in title:
-                hints.append({
-                    'type': 'title_hint',
-                    'text': 'Venue name might be in event title'
-                })
-            
-            # Suggest likely neighborhoods based on genre
-            if event.get('genres'):
-                genres_lower = [g.lower() for g in event['genres']]
-                neighborhoods = []
-                
-                if any('techno' in g or 'house' in g for g in genres_lower):
-                    neighborhoods.append('SOMA')
-                if any('latin' in g or 'reggaeton' in g for g in genres_lower):
-                    neighborhoods.append('Mission')
-                if any('underground' in g or 'warehouse' in g for g in genres_lower):
-                    neighborhoods.extend(['SOMA', 'Dogpatch'])
-                
-                if neighborhoods:
-                    unique_neighborhoods = list(dict.fromkeys(neighborhoods))
-                    hints.append({
-                        'type': 'neighborhood',
-                        'text': f"Likely in {', '.join(unique_neighborhoods)}"
-                    })
-            
-            tba_event['venue_hints'] = hints
-            tba_events.append(tba_event)
-    
-    return tba_events
-
-def create_date_index(events_by_date: Dict[str, List[Dict]], metadata: Dict):
-    """Create an index file with all dates and metadata"""
     index = {
         'generated_at': datetime.now().isoformat(),
         'metadata': metadata,
         'dates': {}
     }
     
-    for date, events in events_by_date.items():
-        visible_events = [e for e in events if not e.get('hidden')]
-        tba_events = [e for e in visible_events if e.get('venue') and 'TBA' in e['venue'].upper()]
+    for date in dates:
+        stats = day_stats[date]
         
-        # Get day of week
-        date_obj = datetime.strptime(date, '%Y-%m-%d')
-        day_name = date_obj.strftime('%A')
+        # Get day of week (fromisoformat is C-level; no locale lookup in strftime)
+        day_name = _DAYS[datetime.fromisoformat(date).weekday()]
         
         index['dates'][date] = {
             'day_of_week': day_name,
-            'event_count': len(visible_events),
-            'tba_count': len(tba_events),
-            'cities': list(set(e.get('city', '') for e in visible_events if e.get('city'))),
-            'genres': list(set(g for e in visible_events for g in e.get('genres', [])))[:10],  # Top 10 genres
-            'has_events': len(visible_events) > 0
+            'event_count': stats['visible'],
+            'tba_count': stats['tba'],
+            'cities': list(stats['cities']),
+            'genres': list(stats['genres'])[:10],  # Top 10 genres
+            'has_events': stats['visible'] > 0
         }
     
-    return index
+    return events_by_date, metadata, tba_events, index
+
+def _usable_cpus() -> int:
+    """CPUs this process may run on (respects container/taskset limits)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+def _write_file(item: Tuple[Path, bytes]):
+    """Write one pre-encoded file (runs in a worker thread)"""
+    path, payload = item
+    path.write_bytes(payload)
+
+def _digest(payload: bytes) -> str:
+    """Short content hash used to skip rewriting unchanged date files"""
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
 
-def save_organized_data(events_by_date: Dict[str, List[Dict]], metadata: Dict, tba_events: List[Dict]):
+def save_organized_data(events_by_date: Dict[str, List[Dict]], metadata: Dict, tba_events: List[Dict], index: Dict):
     """Save all organized data"""
     output_dir = Path("events_by_date")
     output_dir.mkdir(exist_ok=True)
     
-    # Save individual date files
+    # Hashes of the date files written by the previous run (a local build
+    # artifact, ignored by git)
+    hashes_file = output_dir / ".hashes.json"
+    try:
+        prev_hashes = orjson.loads(hashes_file.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        prev_hashes = {}
+    
+    # Encode every date, but only rewrite the files whose content changed
+    hashes = {}
+    changed = []
     for date, events in events_by_date.items():
-        filename = output_dir / f"events_{date}.json"
-        with open(filename, 'w') as f:
-            json.dump(events, f, indent=2)
+        path = output_dir / f"events_{date}.json"
+        payload = orjson.dumps(events, option=orjson.OPT_INDENT_2)
+        hashes[date] = _digest(payload)
+        if prev_hashes.get(date) != hashes[date] or not path.exists():
+            changed.append((path, payload))
+    
+    # Let a thread pool overlap the writes, sized to the CPUs we may run on
+    with ThreadPoolExecutor(max_workers=min(8, _usable_cpus())) as pool:
+        list(pool.map(_write_file, changed))
+    
+    hashes_file.write_bytes(orjson.dumps(hashes))
+    print(f"💾 Wrote {len(changed)} of {len(events_by_date)} date files")
     
     # Save index file
-    index = create_date_index(events_by_date, metadata)
-    with open(output_dir / "index.json", 'w') as f:
-        json.dump(index, f, indent=2)
+    (output_dir / "index.json").write_bytes(orjson.dumps(index, option=orjson.OPT_INDENT_2))
     
     # Save TBA events separately
-    with open("events_tba.json", 'w') as f:
-        json.dump({
-            'total': len(tba_events),
-            'events': tba_events,
-            'generated_at': datetime.now().isoformat()
-        }, f, indent=2)
-    
-    # Save complete organized file
-    with open("events_organized.json", 'w') as f:
-        json.dump({
-            'metadata': metadata,
-            'events_by_date': events_by_date,
-            'tba_events': tba_events,
-            'generated_at': datetime.now().isoformat()
-        }, f, indent=2)
+    Path("events_tba.json").write_bytes(orjson.dumps({
+        'total': len(tba_events),
+        'events': tba_events,
+        'generated_at': datetime.now().isoformat()
+    }, option=orjson.OPT_INDENT_2))
+    
+    # Save complete organized file, streaming one date at a time so the
+    # whole corpus is never encoded into a single buffer
+    with open("events_organized.json", 'wb') as f:
+        f.write(b'{"metadata":')
+        f.write(orjson.dumps(metadata))
+        f.write(b',"events_by_date":{')
+        for i, (date, events) in enumerate(events_by_date.items()):
+            if i:
+                f.write(b',')
+            f.write(b'\n')
+            f.write(orjson.dumps(date))
+            f.write(b':')
+            f.write(orjson.dumps(events))
+        f.write(b'\n},"tba_events":')
+        f.write(orjson.dumps(tba_events))
+        f.write(b',"generated_at":')
+        f.write(orjson.dumps(datetime.now().isoformat()))
+        f.write(b'}\n')
     
     return index
 
@@ -198,23 +268,18 @@ def main():
     events = load_all_events()
     print(f"✅ Loaded {len(events)} total events")
     
-    # Organize by date
-    events_by_date = organize_by_date(events)
+    # Organize by date, gathering metadata and TBA events in the same pass
+    events_by_date, metadata, tba_events, index = process_events(events)
     print(f"📅 Events span {len(events_by_date)} unique dates")
     
-    # Get metadata
-    metadata = get_date_metadata(events_by_date)
     print(f"🏙️  {metadata['statistics']['unique_cities']} cities")
     print(f"🎵 {metadata['statistics']['unique_genres']} genres")
     print(f"📍 {metadata['statistics']['unique_venues']} venues")
     
-    # Identify TBA events
-    all_events_flat = [e for events in events_by_date.values() for e in events]
-    tba_events = identify_tba_events(all_events_flat)
     print(f"❓ {len(tba_events)} TBA venue events identified")
     
     # Save organized data
-    index = save_organized_data(events_by_date, metadata, tba_events)
+    save_organized_data(events_by_date, metadata, tba_events, index)
     
     print("\n✅ Data Organization Complete!")
     print("\nCreated files:")
@@ -225,12 +290,9 @@ def main():
     
     # Show sample dates
     print("\n📅 Sample dates with events:")
-    dates = list(events_by_date.keys())[:5]
-    for date in dates:
-        count = len([e for e in events_by_date[date] if not e.get('hidden')])
-        tba_count = len([e for e in events_by_date[date] 
-                        if not e.get('hidden') and e.get('venue') and 'TBA' in e['venue'].upper()])
-        print(f"  • {date}: {count} events ({tba_count} TBA)")
+    for date in islice(events_by_date, 5):
+        day = index['dates'][date]
+        print(f"  • {date}: {day['event_count']} events ({day['tba_count']} TBA)")
     
     return index
 
@@ -1,29 +1,38 @@
 #!/usr/bin/env python3
-import json
+import orjson
+import os
 import re
 from datetime import datetime
-from bs4 import BeautifulSoup
+import lxml.html
 from pathlib import Path
 import sys
 
+WSN_RE = re.compile(r'\s+\n')
+WS2_RE = re.compile(r'\s{2,}')
+DAY_TIME_RE = re.compile(r'^(.+?)\s*\((.+?)\)\s*$')
+VENUE_RE = re.compile(r'@\s*(.*?)\s*(?:\((.*?)\))?\s*$')
+AGE_RE = re.compile(r'\d+\+|all ages', re.IGNORECASE)
+
 def normalize_text(element):
     """Normalize text by replacing <br> with spaces and cleaning whitespace"""
-    if not element:
+    if element is None:
         return ""
     
-    # Clone and replace <br> tags with spaces
-    html = str(element)
-    html = re.sub(r'<br\s*/?>', ' ', html)
-    
-    # Parse and get text
-    soup = BeautifulSoup(html, 'html.parser')
-    text = soup.get_text()
+    # <br> tags already carry a leading space in their tail (see parse_19hz_html)
+    text = element.text_content()
     
     # Clean whitespace
-    text = re.sub(r'\s+\n', ' ', text)
-    text = re.sub(r'\s{2,}', ' ', text)
+    text = WSN_RE.sub(' ', text)
+    text = WS2_RE.sub(' ', text)
     return text.strip()
 
+def find_by_class(element, class_name):
+    """First descendant of element carrying the given CSS class, or None"""
+    for child in element.iterdescendants():
+        if class_name in (child.get('class') or '').split():
+            return child
+    return None
+
 def parse_19hz_html(html_file, include_hidden=True):
     """Parse 19hz HTML file and extract event data"""
     
@@ -33,17 +42,21 @@ def parse_19hz_html(html_file, include_hidden=True):
     with open(html_file, 'r', encoding='utf-8', errors='ignore') as f:
         html_content = f.read()
     
-    # Parse with BeautifulSoup
-    soup = BeautifulSoup(html_content, 'html.parser')
+    # Parse with lxml's C parser
+    tree = lxml.html.document_fromstring(html_content)
+    
+    # Treat <br> as a space in every text extraction below
+    for br in tree.iter('br'):
+        br.tail = ' ' + (br.tail or '')
     
     # Find tbody
-    tbody = soup.find('tbody')
-    if not tbody:
+    tbody = tree.find('.//tbody')
+    if tbody is None:
         print("❌ No <tbody> found in HTML")
         return []
     
     # Get all rows
-    rows = tbody.find_all('tr')
+    rows = list(tbody.iter('tr'))
     print(f"📊 Found {len(rows)} table rows")
     
     events = []
@@ -56,7 +69,7 @@ def parse_19hz_html(html_file, include_hidden=True):
         if not include_hidden and is_hidden:
             continue
         
-        tds = row.find_all('td')
+        tds = list(row.iter('td'))
         if len(tds) < 7:
             continue  # Skip rows with insufficient columns
         
@@ -66,32 +79,31 @@ def parse_19hz_html(html_file, include_hidden=True):
         time_range = None
         
         if td0_text:
-            match = re.match(r'^(.+?)\s*\((.+?)\)\s*$', td0_text)
+            match = DAY_TIME_RE.match(td0_text)
             if match:
                 day_label = match.group(1).strip()
                 time_range = match.group(2).strip()
             else:
                 day_label = td0_text
         
-        # TD1: Title, URL, Venue, City
+        # TD1: Title, URL, Venue, City (cell text is normalized once and reused)
         td1 = tds[1]
-        link = td1.find('a') if td1 else None
-        title = link.get_text().strip() if link else normalize_text(td1)
-        url = link.get('href') if link else None
+        full_text = normalize_text(td1)
+        link = td1.find('.//a')
+        title = link.text_content().strip() if link is not None else full_text
+        url = link.get('href') if link is not None else None
         
         # Extract venue and city
         venue = None
         city = None
-        if td1:
-            full_text = normalize_text(td1)
-            # Remove title to get venue/city part
-            after_title = full_text.replace(title, '', 1).strip() if title else full_text
-            
-            # Match "@ Venue (City)" pattern
-            venue_match = re.match(r'@\s*(.*?)\s*(?:\((.*?)\))?\s*$', after_title)
-            if venue_match:
-                venue = venue_match.group(1).strip() if venue_match.group(1) else None
-                city = venue_match.group(2).strip() if venue_match.group(2) else None
+        # Remove title to get venue/city part
+        after_title = full_text.replace(title, '', 1).strip() if title else full_text
+        
+        # Match "@ Venue (City)" pattern
+        venue_match = VENUE_RE.match(after_title)
+        if venue_match:
+            venue = venue_match.group(1).strip() if venue_match.group(1) else None
+            city = venue_match.group(2).strip() if venue_match.group(2) else None
         
         # TD2: Genres
         genres_text = normalize_text(tds[2]) if len(tds) > 2 else ""
@@ -106,7 +118,7 @@ def parse_19hz_html(html_file, include_hidden=True):
             
             if len(parts) == 1:
                 # Determine if it's age or price
-                if re.search(r'\d+\+|all ages', parts[0], re.IGNORECASE):
+                if AGE_RE.search(parts[0]):
                     age = parts[0]
                 else:
                     price = parts[0]
@@ -121,18 +133,17 @@ def parse_19hz_html(html_file, include_hidden=True):
         # TD5: Extra links
         extra_links = []
         if len(tds) > 5:
-            links = tds[5].find_all('a')
             extra_links = [
-                {'text': link.get_text().strip(), 'href': link.get('href')}
-                for link in links
+                {'text': link.text_content().strip(), 'href': link.get('href')}
+                for link in tds[5].iter('a')
             ]
         
         # TD6: Date (YYYY/MM/DD format)
         date_iso = None
         if len(tds) > 6:
-            shrink = tds[6].find(class_='shrink')
-            if shrink:
-                date_text = shrink.get_text().strip()
+            shrink = find_by_class(tds[6], 'shrink')
+            if shrink is not None:
+                date_text = shrink.text_content().strip()
                 # Convert YYYY/MM/DD to YYYY-MM-DD
                 date_iso = date_text.replace('/', '-')
             else:
@@ -141,9 +152,10 @@ def parse_19hz_html(html_file, include_hidden=True):
                     date_iso = date_text.replace('/', '-')
         
         # Build event object
+        row_classes = (row.get('class') or '').split()
         event = {
             'hidden': is_hidden,
-            'className': row.get('class', [None])[0] if row.get('class') else None,
+            'className': row_classes[0] if row_classes else None,
             'dayLabel': day_label,
             'timeRange': time_range,
             'title': title,
@@ -165,15 +177,13 @@ def parse_19hz_html(html_file, include_hidden=True):
 def main():
     """Main function to parse 19hz HTML and save as JSON"""
     
-    # Find the most recent HTML file
-    html_files = list(Path('.').glob('19hz_events_*.html'))
+    # Find the most recent HTML file (timestamped names sort chronologically)
+    html_file = max(Path('.').glob('19hz_events_*.html'), default=None)
     
-    if not html_files:
+    if html_file is None:
         print("❌ No 19hz HTML files found. Run fetch_19hz.py first!")
         sys.exit(1)
     
-    # Use the most recent file
-    html_file = sorted(html_files)[-1]
     print(f"📄 Using HTML file: {html_file}")
     
     # Parse HTML
@@ -192,12 +202,11 @@ def main():
     # Date range
     dates = [e['dateISO'] for e in events if e['dateISO']]
     if dates:
-        dates.sort()
-        print(f"   • Date range: {dates[0]} to {dates[-1]}")
+        print(f"   • Date range: {min(dates)} to {max(dates)}")
     
     # Venue/city stats
-    venues = set((e['venue'], e['city']) for e in visible_events if e['venue'])
-    cities = set(e['city'] for e in visible_events if e['city'])
+    venues = {(e['venue'], e['city']) for e in visible_events if e['venue']}
+    cities = {e['city'] for e in visible_events if e['city']}
     
     print(f"   • Unique venues: {len(venues)}")
     print(f"   • Cities: {len(cities)}")
@@ -206,22 +215,23 @@ def main():
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     output_file = f"19hz_events_parsed_{timestamp}.json"
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(events, f, indent=2, ensure_ascii=False)
+    payload = orjson.dumps(events, option=orjson.OPT_INDENT_2)
+    Path(output_file).write_bytes(payload)
     
     print(f"\n✅ Saved {len(events)} events to: {output_file}")
     
     # Also save a "latest" version for convenience
+    # (swapped in whole; server.py reloads it as soon as its mtime changes)
     latest_file = "19hz_events_latest.json"
-    with open(latest_file, 'w', encoding='utf-8') as f:
-        json.dump(events, f, indent=2, ensure_ascii=False)
+    Path(latest_file + ".tmp").write_bytes(payload)
+    os.replace(latest_file + ".tmp", latest_file)
     
     print(f"✅ Also saved as: {latest_file}")
     
     # Sample output
     print("\n📝 Sample event:")
     if visible_events:
-        print(json.dumps(visible_events[0], indent=2))
+        print(orjson.dumps(visible_events[0], option=orjson.OPT_INDENT_2).decode())
     
     return output_file
 
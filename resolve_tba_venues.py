@@ -4,44 +4,137 @@ Smart TBA Venue Resolver
 Attempts to find actual venues for TBA events using multiple strategies
 """
 
-import json
+import asyncio
+import orjson
 import re
+import threading
 import time
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 
+TBA_RE = re.compile(r'TBA|TBD', re.IGNORECASE)
+VENUE_LABEL_RE = re.compile(r'venue|location', re.IGNORECASE)
+NON_VENUE_RE = re.compile(r'TBA|TBD|feat|ft\.|presents', re.IGNORECASE)
+
+# Common patterns in titles
+TITLE_PATTERNS = [
+    re.compile(r'@\s*([^,]+)', re.IGNORECASE),  # @ Venue
+    re.compile(r'at\s+([^,]+)', re.IGNORECASE),  # at Venue
+    re.compile(r':\s*([^,]+)', re.IGNORECASE),   # Event: Venue
+]
+
+# Genre to neighborhood mapping (SF specific)
+NEIGHBORHOOD_MAP = {
+    'techno': ['SOMA', 'Mission'],
+    'house': ['SOMA', 'Mission', 'Castro'],
+    'reggaeton': ['Mission', 'SOMA'],
+    'latin': ['Mission'],
+    'underground': ['SOMA', 'Potrero Hill'],
+    'warehouse': ['SOMA', 'Dogpatch']
+}
+
+# Strategy confidence levels, best first
+CONFIDENCE_RANK = {'high': 0, 'medium': 1, 'low': 2, 'very_low': 3}
+
+# Event pages fetched at once by strategy 2
+SCRAPE_CONCURRENCY = 5
+
+# Minimum spacing between event page requests, shared by all fetch threads
+SCRAPE_INTERVAL = 0.2
+
+# Extra attempts after a 429, each behind the rate limit and a growing backoff
+THROTTLE_RETRIES = 2
+
+@lru_cache(maxsize=1024)
+def title_hint(title: str) -> Optional[Dict]:
+    """Venue hint pulled from an event title, cached per title"""
+    for pattern in TITLE_PATTERNS:
+        match = pattern.search(title)
+        if match:
+            potential_venue = match.group(1).strip()
+            # Filter out obvious non-venues
+            if not NON_VENUE_RE.search(potential_venue):
+                return {
+                    'strategy': 'title_analysis',
+                    'confidence': 'low',
+                    'venue': potential_venue,
+                    'reason': f"Extracted from title: '{title}'"
+                }
+    
+    return None
+
+@lru_cache(maxsize=1024)
+def neighborhood_hint(genres: tuple) -> Optional[Dict]:
+    """Likely SF neighborhoods for a genre list, cached per genre list"""
+    suggestions = []
+    for genre in genres:
+        for key, neighborhoods in NEIGHBORHOOD_MAP.items():
+            if key in genre.lower():
+                suggestions.extend(neighborhoods)
+    
+    if suggestions:
+        # Get unique neighborhoods
+        unique = list(dict.fromkeys(suggestions))
+        return {
+            'strategy': 'neighborhood_inference',
+            'confidence': 'very_low',
+            'neighborhoods': unique[:3],
+            'reason': f"Based on genres: {', '.join(genres[:3])}"
+        }
+    
+    return None
+
 class TBAResolver:
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
         })
+        # Keep-alive pool sized for the concurrent page scrapes
+        adapter = HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=20,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.promoter_venues = {}
         self.resolved_venues = {}
+        self._promoter_hints = {}
+        self._next_ok = 0.0  # monotonic time of the next allowed page request
+        self._rate_lock = threading.Lock()
         
     def load_events(self, filename='events_all_geocoded.json'):
         """Load events and identify TBA venues"""
-        with open(filename, 'r') as f:
-            events = json.load(f)
+        with open(filename, 'rb') as f:
+            events = orjson.loads(f.read())
         
-        # Find TBA events
-        self.tba_events = [
-            e for e in events 
-            if e.get('venue') and re.search(r'TBA|TBD|tba|tbd', e['venue'])
-        ]
-        
-        # Build promoter history
+        # Find TBA events and build promoter history in one pass,
+        # classifying each venue only once
+        self.tba_events = []
+        self._promoter_hints.clear()
+        promoter_venues = self.promoter_venues
+        search_tba = TBA_RE.search
         for event in events:
-            if not re.search(r'TBA|TBD', event.get('venue', ''), re.I):
-                for promoter in event.get('promoters', []):
-                    if promoter not in self.promoter_venues:
-                        self.promoter_venues[promoter] = []
-                    venue_city = f"{event.get('venue')} ({event.get('city')})"
-                    if venue_city not in self.promoter_venues[promoter]:
-                        self.promoter_venues[promoter].append(venue_city)
+            venue = event.get('venue')
+            if venue and search_tba(venue):
+                self.tba_events.append(event)
+                continue
+            
+            promoters = event.get('promoters')
+            if promoters:
+                venue_city = f"{venue} ({event.get('city')})"
+                # Dicts act as insertion-ordered sets, so the first venues
+                # seen for a promoter stay first
+                for promoter in promoters:
+                    promoter_venues.setdefault(promoter, {})[venue_city] = None
         
         print(f"📊 Found {len(self.tba_events)} TBA events")
         print(f"📚 Built promoter history for {len(self.promoter_venues)} promoters")
@@ -50,14 +143,22 @@ class TBAResolver:
     
     def strategy_1_promoter_history(self, event):
         """Use promoter's historical venues"""
-        promoters = event.get('promoters', [])
+        # Many TBA events share a promoter lineup; the history is fixed once
+        # load_events has run, so each lineup is only worked out once
+        promoters = tuple(event.get('promoters', []))
+        if promoters not in self._promoter_hints:
+            self._promoter_hints[promoters] = self._promoter_history_hint(promoters)
+        return self._promoter_hints[promoters]
+    
+    def _promoter_history_hint(self, promoters):
+        """Top historical venues for a tuple of promoters"""
         suggestions = []
         
         for promoter in promoters:
             if promoter in self.promoter_venues:
                 venues = self.promoter_venues[promoter]
                 if venues:
-                    suggestions.extend(venues[:3])  # Top 3 venues
+                    suggestions.extend(islice(venues, 3))  # Top 3 venues
         
         if suggestions:
             return {
@@ -81,11 +182,20 @@ class TBAResolver:
         try:
             # Only for RA.co links for now (they're reliable)
             if 'ra.co' in url:
-                response = self.session.get(url, timeout=5)
+                # 429s are retried here rather than by the adapter, so every
+                # retry still waits for its slot in the shared rate limit
+                for attempt in range(THROTTLE_RETRIES + 1):
+                    self.rate_limit()
+                    response = self.session.get(url, timeout=5)
+                    if response.status_code != 429:
+                        break
+                    self.back_off(attempt)
+                else:
+                    return None
                 soup = BeautifulSoup(response.text, 'html.parser')
                 
                 # Look for venue info in common patterns
-                venue_elem = soup.find('span', string=re.compile(r'venue|location', re.I))
+                venue_elem = soup.find('span', string=VENUE_LABEL_RE)
                 if venue_elem:
                     venue_text = venue_elem.find_next_sibling()
                     if venue_text:
@@ -100,73 +210,50 @@ class TBAResolver:
         
         return None
     
+    def rate_limit(self):
+        """Space page requests SCRAPE_INTERVAL apart across the fetch threads"""
+        # Claim the next slot under the lock, then sleep outside it so the
+        # other threads can queue up behind us
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_ok)
+            self._next_ok = slot + SCRAPE_INTERVAL
+        time.sleep(slot - now)
+    
+    def back_off(self, attempt: int):
+        """Hold back every fetch thread after a 429 Too Many Requests"""
+        with self._rate_lock:
+            self._next_ok = max(self._next_ok, time.monotonic() + 2 ** attempt)
+    
     def strategy_3_title_analysis(self, event):
         """Extract venue hints from event title"""
-        title = event.get('title', '')
-        
-        # Common patterns in titles
-        patterns = [
-            r'@\s*([^,]+)',  # @ Venue
-            r'at\s+([^,]+)',  # at Venue
-            r':\s*([^,]+)',   # Event: Venue
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, title, re.I)
-            if match:
-                potential_venue = match.group(1).strip()
-                # Filter out obvious non-venues
-                if not re.search(r'TBA|TBD|feat|ft\.|presents', potential_venue, re.I):
-                    return {
-                        'strategy': 'title_analysis',
-                        'confidence': 'low',
-                        'venue': potential_venue,
-                        'reason': f"Extracted from title: '{title}'"
-                    }
-        
-        return None
+        return title_hint(event.get('title', ''))
     
     def strategy_4_neighborhood_inference(self, event):
         """Infer likely neighborhoods from event type"""
-        genres = event.get('genres', [])
-        city = event.get('city', '')
-        
-        if city != 'San Francisco':
+        if event.get('city', '') != 'San Francisco':
             return None
+        return neighborhood_hint(tuple(event.get('genres', [])))
+    
+    async def scrape_event_pages(self, events: List[Dict]) -> List[Optional[Dict]]:
+        """Run strategy 2 for the given events concurrently, a few page fetches at a time"""
+        semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
         
-        # Genre to neighborhood mapping (SF specific)
-        neighborhood_map = {
-            'techno': ['SOMA', 'Mission'],
-            'house': ['SOMA', 'Mission', 'Castro'],
-            'reggaeton': ['Mission', 'SOMA'],
-            'latin': ['Mission'],
-            'underground': ['SOMA', 'Potrero Hill'],
-            'warehouse': ['SOMA', 'Dogpatch']
-        }
-        
-        suggestions = []
-        for genre in genres:
-            for key, neighborhoods in neighborhood_map.items():
-                if key in genre.lower():
-                    suggestions.extend(neighborhoods)
-        
-        if suggestions:
-            # Get unique neighborhoods
-            unique = list(dict.fromkeys(suggestions))
-            return {
-                'strategy': 'neighborhood_inference',
-                'confidence': 'very_low',
-                'neighborhoods': unique[:3],
-                'reason': f"Based on genres: {', '.join(genres[:3])}"
-            }
+        async def scrape(event):
+            async with semaphore:
+                return await asyncio.to_thread(self.strategy_2_event_page_scrape, event)
         
-        return None
+        return await asyncio.gather(*(scrape(event) for event in events))
     
     def resolve_all(self):
         """Try to resolve all TBA venues"""
         results = []
         
-        for i, event in enumerate(self.tba_events, 1):
+        # The page scrape is the only strategy that can reach 'high', so it
+        # runs for every event; fetch the pages concurrently up front
+        scraped = asyncio.run(self.scrape_event_pages(self.tba_events))
+        
+        for i, (event, page_result) in enumerate(zip(self.tba_events, scraped), 1):
             print(f"\n[{i}/{len(self.tba_events)}] Resolving: {event.get('title', 'Unknown')[:60]}...")
             
             resolution = {
@@ -174,10 +261,10 @@ class TBAResolver:
                 'resolutions': []
             }
             
-            # Try each strategy
+            # Try each strategy in order, stopping early on a high-confidence hit
             strategies = [
                 self.strategy_1_promoter_history,
-                self.strategy_2_event_page_scrape,
+                lambda event: page_result,  # strategy 2, fetched above
                 self.strategy_3_title_analysis,
                 self.strategy_4_neighborhood_inference
             ]
@@ -187,15 +274,15 @@ class TBAResolver:
                 if result:
                     resolution['resolutions'].append(result)
                     print(f"  ✓ {result['strategy']}: {result.get('confidence', 'unknown')} confidence")
+                    if result.get('confidence') == 'high':
+                        break
             
             if not resolution['resolutions']:
                 print(f"  ✗ No resolution found")
             
+            # Best answer first; ties keep strategy order
+            resolution['resolutions'].sort(key=lambda r: CONFIDENCE_RANK.get(r.get('confidence'), len(CONFIDENCE_RANK)))
             results.append(resolution)
-            
-            # Rate limit for scraping
-            if i % 5 == 0:
-                time.sleep(1)
         
         return results
     
@@ -213,8 +300,7 @@ class TBAResolver:
             'resolutions': results
         }
         
-        with open(filename, 'w') as f:
-            json.dump(summary, f, indent=2)
+        Path(filename).write_bytes(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
         
         print(f"\n📊 Summary:")
         print(f"  • Total TBA events: {summary['total_tba_events']}")
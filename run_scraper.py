@@ -7,6 +7,8 @@ import os
 import sys
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 import logfire
 
@@ -30,32 +32,47 @@ def trigger_scrape():
         service_url=service_url
     )
     
+    # One pooled session for every attempt, so the TLS connection opened by
+    # the wake-up health check is reused by the scrape request. Retry only
+    # covers idempotent requests; the POST is still retried by the loop below.
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        max_retries=Retry(total=3, backoff_factor=2, status_forcelist=[502, 503, 504])
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    
     max_retries = 3
+    needs_wake = False
     for attempt in range(max_retries):
         try:
             logger.info(f"Attempting to trigger scrape at {service_url}/api/scrape (attempt {attempt + 1})")
             
-            # Wake up the service first if it's sleeping
-            wake_response = requests.get(f"{service_url}/health", timeout=60)
-            logger.info(f"Health check response: {wake_response.status_code}")
-            
-            logfire.info(
-                'Health check',
-                service='cron',
-                event_type='health_check',
-                status_code=wake_response.status_code,
-                attempt=attempt + 1
-            )
-            
-            # Give it a moment to fully wake up
-            time.sleep(2)
+            # A warm service takes the POST straight away; only wake it with a
+            # health check after a previous attempt couldn't reach it
+            if needs_wake:
+                wake_response = session.get(f"{service_url}/health", timeout=60)
+                logger.info(f"Health check response: {wake_response.status_code}")
+                
+                logfire.info(
+                    'Health check',
+                    service='cron',
+                    event_type='health_check',
+                    status_code=wake_response.status_code,
+                    attempt=attempt + 1
+                )
             
-            # Trigger the scrape with longer timeout (10 minutes)
-            response = requests.post(
-                f"{service_url}/api/scrape", 
-                timeout=600,
-                headers={'User-Agent': 'Python/CronJob'}  # Identify as cron
-            )
+            # Trigger the scrape; quick connect timeout, long read timeout (10 minutes)
+            try:
+                response = session.post(
+                    f"{service_url}/api/scrape", 
+                    timeout=(5, 600),
+                    headers={'User-Agent': 'Python/CronJob'}  # Identify as cron
+                )
+            except requests.ConnectionError:
+                needs_wake = True
+                raise
+            needs_wake = response.status_code >= 500
             response.raise_for_status()
             
             result = response.json()
@@ -4,23 +4,29 @@ Background scraper service for fetching and geocoding events
 """
 
 import asyncio
-import json
 import os
 import re
-import time
-from datetime import datetime, timedelta
+import sys
+from io import BytesIO
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from lxml import etree
+import orjson
 import requests
-from bs4 import BeautifulSoup
-from sqlalchemy import create_engine
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, Session
 import logfire
 
+from geocode_cache import GeocodeCache, NominatimClient, make_key
 from models import (
-    Base, Event, Venue, Genre, Promoter, EventLink,
-    create_database, get_session
+    Event, Venue, Genre, Promoter, EventLink, event_genres, event_promoters,
+    create_database, get_session, pack_original_json, rebuild_search_index,
+    refresh_name_stats
 )
 
 # Configure logging
@@ -32,13 +38,74 @@ if os.environ.get('LOGFIRE_WRITE_TOKEN'):
     logfire.configure(token=os.environ.get('LOGFIRE_WRITE_TOKEN'))
     logger.info('Logfire initialized for scraper service')
 
+# Row parsing patterns, compiled once
+DATE_RE = re.compile(r'(\w{3}): (\w{3}) (\d{1,2})')
+YEAR_RE = re.compile(r'(\d{4})')
+TIME_RE = re.compile(r'\((\d{1,2}(?::\d{2})?(?:am|pm)(?:\s*-\s*\d{1,2}(?::\d{2})?(?:am|pm))?)\)', re.I)
+TITLE_RE = re.compile(r'^([^@]+)')
+VENUE_NODE_RE = re.compile(r'@\s+([^(]+?)(?:\s*\(([^)]+)\))?$')
+VENUE_TEXT_RE = re.compile(r'@\s+([^()]+?)(?:\s*\(([^)]+)\))?')
+PRICE_RE = re.compile(r'(\$[\d\.\-]+(?: ?[-/] ?\$[\d\.]+)?|free)', re.I)
+AGE_RE = re.compile(r'(\d+\+|a/a|all ages)', re.I)
+TBA_RE = re.compile(r'TBA|TBD', re.I)
+
+# Geocoder search endpoint. Defaults to public Nominatim (1 req/s policy); point
+# it at a self-hosted Nominatim or Photon (e.g. http://photon:2322/api) to lift
+# the rate limit
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/search')
+GEOCODE_INTERVAL = 1.0 if 'nominatim.openstreetmap.org' in NOMINATIM_URL else 0.0
+
+# Scraped events written per transaction; commits are cheap under WAL
+COMMIT_EVERY = 200
+
+MONTHS = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+          'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+
+
+def photon_results(body: Dict) -> List[Dict]:
+    """Convert a Photon GeoJSON response to the Nominatim jsonv2 fields we use"""
+    results = []
+    for feature in body.get('features', []):
+        lon, lat = feature['geometry']['coordinates'][:2]
+        props = feature.get('properties', {})
+        parts = (props.get('name'), props.get('street'), props.get('city'), props.get('state'))
+        results.append({
+            'lat': lat,
+            'lon': lon,
+            'display_name': ', '.join(p for p in parts if p),
+            'type': props.get('osm_value', '')
+        })
+    return results
+
+
+def cell_text(element, separator: str = '') -> str:
+    """Stripped text of an element, joining its text nodes like bs4's get_text(strip=True)"""
+    return separator.join(t for t in (t.strip() for t in element.itertext()) if t)
+
 
 class EventScraper:
     """Scrape events from 19hz.info"""
     
     def __init__(self):
         self.base_url = "https://19hz.info/eventlisting_BayArea.php"
-        self.geocode_cache = {}
+        self.date_range = None
+        self.out_of_range = 0
+        # Persistent hits and misses shared with the batch geocoding scripts
+        self.geocode_cache = GeocodeCache()
+        
+        # One keep-alive session for the page fetch and every Nominatim call
+        self.http = requests.Session()
+        self.http.headers.update({'User-Agent': 'SF-Events-Map/1.0'})
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            max_retries=Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504])
+        )
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+        self.nominatim = NominatimClient(
+            self.geocode_cache, NOMINATIM_URL, GEOCODE_INTERVAL, session=self.http
+        )
         
     def fetch_html(self) -> str:
         """Fetch the HTML content from 19hz"""
@@ -47,68 +114,92 @@ class EventScraper:
         }
         
         try:
-            response = requests.get(self.base_url, headers=headers, timeout=30)
+            response = self.http.get(self.base_url, headers=headers, timeout=30)
             response.raise_for_status()
             return response.text
         except Exception as e:
             logger.error(f"Failed to fetch HTML: {e}")
             raise
     
-    def parse_events(self, html_content: str) -> List[Dict]:
-        """Parse events from HTML"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        events = []
+    def parse_events(self, html_content: str, date_range: Optional[Tuple[date, date]] = None) -> List[Dict]:
+        """Parse events from HTML
         
-        # Find all event rows in the table
-        # Events are in TR elements with links
-        all_rows = soup.find_all('tr')
-        event_rows = [row for row in all_rows if row.find('a') and len(row.find_all('td')) >= 4]
-        logger.info(f"Found {len(event_rows)} event rows to parse")
-        
-        for row in event_rows:
-            try:
-                event = self.parse_single_event(row)
-                if event:
-                    events.append(event)
-            except Exception as e:
-                logger.warning(f"Error parsing event: {e}")
-                continue
+        With a (first, last) date_range, rows dated outside it are dropped as
+        soon as their date is read; self.out_of_range counts them.
+        """
+        events = []
+        self.date_range = date_range
+        self.out_of_range = 0
+        
+        # Stream the rows: each <tr> is handled as soon as it closes, then
+        # dropped along with the rows before it, so the whole document tree
+        # is never held in memory at once
+        row_count = 0
+        source = BytesIO(html_content.encode('utf-8'))
+        for _, row in etree.iterparse(source, events=('end',), tag='tr', html=True, encoding='utf-8'):
+            # Events are in TR elements with links
+            if row.find('.//a') is not None:
+                cells = list(row.iter('td'))
+                if len(cells) >= 4:
+                    row_count += 1
+                    try:
+                        event = self.parse_single_event(row, cells)
+                        if event:
+                            events.append(event)
+                    except Exception as e:
+                        logger.warning(f"Error parsing event: {e}")
+            
+            # Rows nested inside another row's cells are left for the outer row
+            if next(row.iterancestors('td'), None) is None:
+                row.clear()
+                while row.getprevious() is not None:
+                    del row.getparent()[0]
         
+        logger.info(f"Parsed {row_count} event rows")
         return events
     
-    def parse_single_event(self, row) -> Optional[Dict]:
-        """Parse a single event row from table"""
+    def parse_single_event(self, row, cells: Optional[List] = None) -> Optional[Dict]:
+        """Parse a single event row (an lxml element) from table"""
         event = {}
         
         # Get all TD cells
-        cells = row.find_all('td')
+        if cells is None:
+            cells = list(row.iter('td'))
         if len(cells) < 4:
             return None
         
         # First cell: Date and time
-        date_cell = cells[0].get_text(strip=True)
+        date_cell = cell_text(cells[0])
         # Parse date like "Sat: Aug 30"
-        date_match = re.search(r'(\w{3}): (\w{3}) (\d{1,2})', date_cell)
+        date_match = DATE_RE.search(date_cell)
         if date_match:
             day_abbr, month_abbr, day_num = date_match.groups()
             event['dayLabel'] = f"{day_abbr}: {month_abbr} {day_num}"
             
             # Convert to ISO date (assuming current year)
-            months = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-                     'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
-            month_num = months.get(month_abbr, 1)
+            month_num = MONTHS.get(month_abbr, 1)
             # Check if year is in the last cell (hidden sort column)
             year = 2025  # Default
             if len(cells) > 5:
-                year_text = cells[-1].get_text(strip=True)
-                year_match = re.search(r'(\d{4})', year_text)
+                year_text = cell_text(cells[-1])
+                year_match = YEAR_RE.search(year_text)
                 if year_match:
                     year = int(year_match.group(1))
             
             event['dateISO'] = f"{year:04d}-{month_num:02d}-{int(day_num):02d}"
+            
+            # Skip the rest of the row if it falls outside the requested window
+            if self.date_range:
+                try:
+                    event_date = date(year, month_num, int(day_num))
+                except ValueError:
+                    event_date = None  # If date parsing fails, include it anyway
+                if event_date and not (self.date_range[0] <= event_date <= self.date_range[1]):
+                    self.out_of_range += 1
+                    return None
         
         # Parse time from first cell
-        time_match = re.search(r'\((\d{1,2}(?::\d{2})?(?:am|pm)(?:\s*-\s*\d{1,2}(?::\d{2})?(?:am|pm))?)\)', date_cell, re.I)
+        time_match = TIME_RE.search(date_cell)
         if time_match:
             event['timeRange'] = time_match.group(1)
         
@@ -116,59 +207,63 @@ class EventScraper:
         event_cell = cells[1]
         
         # Get title from first link
-        title_link = event_cell.find('a')
-        if title_link:
-            event['title'] = title_link.get_text(strip=True)
+        links = list(event_cell.iter('a'))
+        if links:
+            title_link = links[0]
+            event['title'] = cell_text(title_link)
             event['url'] = title_link.get('href', '')
         else:
             # Sometimes title is just text
-            event_text = event_cell.get_text(strip=True)
-            title_match = re.match(r'^([^@]+)', event_text)
+            event_text = cell_text(event_cell)
+            title_match = TITLE_RE.match(event_text)
             if title_match:
                 event['title'] = title_match.group(1).strip()
         
         # Parse venue and city
         # The venue comes after @ and city is in parentheses
         # Note: HTML may be malformed with missing </td> tags
-        event_html = str(event_cell)
-        
-        # Try to extract venue from raw HTML first (more reliable with malformed HTML)
-        venue_match = re.search(r'@\s+([^(<]+?)(?:\s*\(([^)]+)\))?(?:<|$)', event_html)
+        # Try each text node on its own first (more reliable with malformed HTML):
+        # the venue text ends where the next tag starts, so no serialising needed
+        venue_match = None
+        for chunk in event_cell.itertext():
+            venue_match = VENUE_NODE_RE.search(chunk)
+            if venue_match:
+                break
         if venue_match:
             event['venue'] = venue_match.group(1).strip()
             event['city'] = venue_match.group(2).strip() if venue_match.group(2) else 'San Francisco'
         else:
             # Fallback to text extraction
-            event_text = event_cell.get_text(' ', strip=True)
-            venue_match = re.search(r'@\s+([^()]+?)(?:\s*\(([^)]+)\))?', event_text)
+            event_text = cell_text(event_cell, ' ')
+            venue_match = VENUE_TEXT_RE.search(event_text)
             if venue_match:
                 event['venue'] = venue_match.group(1).strip()
                 event['city'] = venue_match.group(2).strip() if venue_match.group(2) else 'San Francisco'
         
         # Third cell: Genres
         if len(cells) > 2:
-            genres_text = cells[2].get_text(strip=True)
+            genres_text = cell_text(cells[2])
             # Split by comma
             genres = [g.strip() for g in genres_text.split(',') if g.strip()]
             event['genres'] = genres
         
         # Fourth cell: Price and age
         if len(cells) > 3:
-            price_age_text = cells[3].get_text(strip=True)
+            price_age_text = cell_text(cells[3])
             
             # Parse price
-            price_match = re.search(r'(\$[\d\.\-]+(?: ?[-/] ?\$[\d\.]+)?|free)', price_age_text, re.I)
+            price_match = PRICE_RE.search(price_age_text)
             if price_match:
                 event['price'] = price_match.group(1)
             
             # Parse age
-            age_match = re.search(r'(\d+\+|a/a|all ages)', price_age_text, re.I)
+            age_match = AGE_RE.search(price_age_text)
             if age_match:
                 event['age'] = age_match.group(1)
         
         # Fifth cell: Promoter
         if len(cells) > 4:
-            promoter_text = cells[4].get_text(strip=True)
+            promoter_text = cell_text(cells[4])
             if promoter_text and promoter_text != '-':
                 event['promoters'] = [promoter_text]
             else:
@@ -178,9 +273,9 @@ class EventScraper:
         
         # Get extra links from event cell
         extra_links = []
-        for link in event_cell.find_all('a')[1:]:  # Skip first link (title)
+        for link in links[1:]:  # Skip first link (title)
             href = link.get('href', '')
-            link_text = link.get_text(strip=True)
+            link_text = cell_text(link)
             if href and link_text:
                 extra_links.append({'text': link_text, 'href': href})
         event['extraLinks'] = extra_links
@@ -189,10 +284,18 @@ class EventScraper:
         
         return event
     
-    def geocode_venue(self, venue_name: str, city: str) -> Optional[Dict]:
+    async def nominatim_search(self, query: str) -> List[Dict]:
+        """Run one search through the shared rate-limited client
+        
+        Photon responses are returned in Nominatim's shape.
+        """
+        results = await self.nominatim.search(query)
+        return photon_results(results) if isinstance(results, dict) else results
+    
+    async def geocode_venue(self, venue_name: str, city: str) -> Optional[Dict]:
         """Geocode a venue using Nominatim API"""
-        # Check cache first
-        cache_key = f"{venue_name}|{city}"
+        # Check cache first (normalized key; known misses come back as None)
+        cache_key = make_key(venue_name, city)
         if cache_key in self.geocode_cache:
             return self.geocode_cache[cache_key]
         
@@ -204,24 +307,7 @@ class EventScraper:
         search_query = f"{venue_name}, {city}, California"
         
         try:
-            # Rate limit: 1 request per second
-            time.sleep(1)
-            
-            url = "https://nominatim.openstreetmap.org/search"
-            params = {
-                'q': search_query,
-                'format': 'jsonv2',
-                'limit': 1,
-                'countrycodes': 'us'
-            }
-            headers = {
-                'User-Agent': 'SF-Events-Map/1.0'
-            }
-            
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            results = response.json()
+            results = await self.nominatim_search(search_query)
             if results:
                 location = results[0]
                 coords = {
@@ -235,10 +321,7 @@ class EventScraper:
                 return coords
             else:
                 # Try city center as fallback
-                time.sleep(1)
-                params['q'] = f"{city}, California"
-                response = requests.get(url, params=params, headers=headers, timeout=10)
-                results = response.json()
+                results = await self.nominatim_search(f"{city}, California")
                 
                 if results:
                     location = results[0]
@@ -250,11 +333,18 @@ class EventScraper:
                     }
                     self.geocode_cache[cache_key] = coords
                     return coords
+                
+                # Remember the miss so later runs don't spend the rate limit on it
+                self.geocode_cache[cache_key] = None
         
         except Exception as e:
             logger.warning(f"Geocoding failed for {venue_name}: {e}")
         
         return None
+    
+    async def geocode_many(self, locations: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """Geocode venue/city pairs concurrently under the shared 1 req/s limit"""
+        return await self.nominatim.geocode_many(self.geocode_venue, locations)
 
 
 class DatabaseUpdater:
@@ -263,173 +353,354 @@ class DatabaseUpdater:
     def __init__(self, db_session: Session):
         self.session = db_session
         self.venue_cache = {}
+        self.venues_without_coords = set()
         self.genre_cache = {}
         self.promoter_cache = {}
-        
-    def get_or_create_venue(self, venue_name: str, city: str, coordinates: Optional[Dict] = None) -> Venue:
-        """Get existing venue or create new one"""
-        cache_key = f"{venue_name}|{city}"
-        
-        if cache_key in self.venue_cache:
-            return self.venue_cache[cache_key]
-        
-        # Check if it's a TBA venue
-        is_tba = bool(venue_name and re.search(r'TBA|TBD', venue_name, re.I))
-        
-        # Query database
-        venue = self.session.query(Venue).filter(
-            Venue.name == venue_name,
-            Venue.city == city
-        ).first()
-        
-        if not venue:
-            venue = Venue(
-                name=venue_name,
-                city=city,
-                is_tba=is_tba
-            )
-            
-            if coordinates:
-                venue.latitude = coordinates.get('lat')
-                venue.longitude = coordinates.get('lon')
-                venue.display_name = coordinates.get('display_name')
-                venue.is_approximate = coordinates.get('approximate', False)
+        self.event_ids = {}
+        self.event_genre_ids = {}
+        self.event_promoter_ids = {}
+        self.event_dates = set()
+        self.pending = []  # new events waiting for flush_new_events
+        self.pending_by_key = {}
+        
+    def discard_event(self, savepoint):
+        """Undo one failed event's writes and forget ids that may belong to them
+        
+        Only the event's savepoint is rolled back, so the events processed
+        (and queued) before it are kept. The failed event never reached the
+        queue, but its venue, genre and link writes may be in the caches.
+        """
+        savepoint.rollback()
+        self.genre_cache.clear()
+        self.promoter_cache.clear()
+        self.load_existing()
+    
+    def load_existing(self):
+        """Cache every venue id, and the ids and links of existing events on the scraped dates
+        
+        A few queries up front replace a venue lookup, an event lookup and a
+        link rewrite per scraped event.
+        """
+        self.venue_cache.clear()
+        self.venues_without_coords.clear()
+        for venue_id, name, city, latitude in self.session.execute(
+            select(Venue.id, Venue.name, Venue.city, Venue.latitude)
+        ):
+            self.venue_cache[(name, city)] = venue_id
+            if not latitude:
+                self.venues_without_coords.add(venue_id)
+        
+        self.event_ids.clear()
+        self.event_genre_ids.clear()
+        self.event_promoter_ids.clear()
+        if self.event_dates:
+            for event_id, title, event_date in self.session.execute(
+                select(Event.id, Event.title, Event.date)
+                .where(Event.date.in_(self.event_dates))
+                .order_by(Event.id)
+            ):
+                self.event_ids.setdefault((title, event_date), event_id)
             
-            self.session.add(venue)
-            # Don't flush here - let it happen with the event
-        elif coordinates and not venue.latitude:
-            # Update coordinates if venue exists but lacks them
-            venue.latitude = coordinates.get('lat')
-            venue.longitude = coordinates.get('lon')
-            venue.display_name = coordinates.get('display_name')
-            venue.is_approximate = coordinates.get('approximate', False)
-        
-        self.venue_cache[cache_key] = venue
-        return venue
+            # Current links of those events, so updates only write what changed
+            for table, column, links in (
+                (event_genres, event_genres.c.genre_id, self.event_genre_ids),
+                (event_promoters, event_promoters.c.promoter_id, self.event_promoter_ids),
+            ):
+                for event_id, link_id in self.session.execute(
+                    select(table.c.event_id, column)
+                    .join(Event, Event.id == table.c.event_id)
+                    .where(Event.date.in_(self.event_dates))
+                ):
+                    links.setdefault(event_id, set()).add(link_id)
     
-    def get_or_create_genre(self, genre_name: str) -> Genre:
-        """Get existing genre or create new one"""
-        if genre_name in self.genre_cache:
-            return self.genre_cache[genre_name]
-        
-        genre = self.session.query(Genre).filter(Genre.name == genre_name).first()
-        
-        if not genre:
-            genre = Genre(name=genre_name)
-            self.session.add(genre)
-            # Don't flush here - let it happen with the event
+    def preload(self, events: List[Dict]):
+        """Upsert every genre and promoter the scraped events mention and cache their ids
+        
+        One INSERT ... ON CONFLICT DO NOTHING per table creates whatever is
+        missing, then one SELECT reads all the ids back. Venues are left to
+        get_or_create_venue because they pick up coordinates as they are
+        geocoded; existing venue and event ids are loaded by load_existing.
+        """
+        genre_names = {}
+        promoter_names = {}
+        self.event_dates = set()
+        for event_data in events:
+            date_str = event_data.get('dateISO')
+            if date_str:
+                try:
+                    self.event_dates.add(date.fromisoformat(date_str))
+                except ValueError:
+                    pass
+            for genre_name in event_data.get('genres', []):
+                if genre_name:
+                    genre_names.setdefault(genre_name.lower(), genre_name)
+            for promoter_name in event_data.get('promoters', []):
+                if promoter_name:
+                    promoter_names.setdefault(promoter_name.lower(), promoter_name)
+        
+        for model, names, cache in (
+            (Genre, genre_names, self.genre_cache),
+            (Promoter, promoter_names, self.promoter_cache),
+        ):
+            if not names:
+                continue
+            self.session.execute(
+                sqlite_insert(model).values([{'name': name} for name in names.values()])
+                .on_conflict_do_nothing()
+            )
+            for row_id, name in self.session.execute(
+                select(model.id, model.name).where(model.name.in_(names.values()))
+            ):
+                cache[sys.intern(name.lower())] = row_id
         
-        self.genre_cache[genre_name] = genre
-        return genre
+        self.load_existing()
     
-    def get_or_create_promoter(self, promoter_name: str) -> Promoter:
-        """Get existing promoter or create new one"""
-        if promoter_name in self.promoter_cache:
-            return self.promoter_cache[promoter_name]
-        
-        promoter = self.session.query(Promoter).filter(Promoter.name == promoter_name).first()
+    def get_or_create_venue(self, venue_name: str, city: str, coordinates: Optional[Dict] = None) -> int:
+        """Get the id of an existing venue or create a new one"""
+        # Tuple keys hash the two strings without building a new one per lookup
+        cache_key = (venue_name, city)
+        
+        coord_values = {}
+        if coordinates:
+            coord_values = {
+                'latitude': coordinates.get('lat'),
+                'longitude': coordinates.get('lon'),
+                'display_name': coordinates.get('display_name'),
+                'is_approximate': coordinates.get('approximate', False)
+            }
         
-        if not promoter:
-            promoter = Promoter(name=promoter_name)
-            self.session.add(promoter)
-            # Don't flush here - let it happen with the event
+        venue_id = self.venue_cache.get(cache_key)
+        if venue_id is not None:
+            if coord_values and venue_id in self.venues_without_coords:
+                # Update coordinates if venue exists but lacks them
+                self.session.execute(update(Venue).where(Venue.id == venue_id).values(**coord_values))
+                self.venues_without_coords.discard(venue_id)
+            return venue_id
         
-        self.promoter_cache[promoter_name] = promoter
-        return promoter
+        # Check if it's a TBA venue
+        is_tba = bool(venue_name and TBA_RE.search(venue_name))
+        
+        # load_existing cached every venue, so a miss is a new venue; the
+        # select only covers a concurrent insert
+        venue_id = self.session.execute(
+            sqlite_insert(Venue).values(name=venue_name, city=city, is_tba=is_tba, **coord_values)
+            .on_conflict_do_nothing().returning(Venue.id)
+        ).scalar()
+        if venue_id is None:
+            venue_id = self.session.execute(
+                select(Venue.id).where(Venue.name == venue_name, Venue.city == city)
+            ).scalar_one()
+        
+        self.venue_cache[cache_key] = venue_id
+        if not coord_values.get('latitude'):
+            self.venues_without_coords.add(venue_id)
+        return venue_id
+    
+    def get_or_create_genre(self, genre_name: str) -> int:
+        """Get the id of an existing genre or create a new one"""
+        # Names are unique case-insensitively (NOCASE), so cache on the lowered name;
+        # interned keys let repeat lookups compare by identity
+        cache_key = sys.intern(genre_name.lower())
+        if cache_key in self.genre_cache:
+            return self.genre_cache[cache_key]
+        
+        # Insert first; RETURNING yields nothing if the name already exists
+        genre_id = self.session.execute(
+            sqlite_insert(Genre).values(name=genre_name).on_conflict_do_nothing().returning(Genre.id)
+        ).scalar()
+        if genre_id is None:
+            genre_id = self.session.execute(select(Genre.id).where(Genre.name == genre_name)).scalar_one()
+        
+        self.genre_cache[cache_key] = genre_id
+        return genre_id
+    
+    def get_or_create_promoter(self, promoter_name: str) -> int:
+        """Get the id of an existing promoter or create a new one"""
+        cache_key = sys.intern(promoter_name.lower())
+        if cache_key in self.promoter_cache:
+            return self.promoter_cache[cache_key]
+        
+        promoter_id = self.session.execute(
+            sqlite_insert(Promoter).values(name=promoter_name).on_conflict_do_nothing()
+            .returning(Promoter.id)
+        ).scalar()
+        if promoter_id is None:
+            promoter_id = self.session.execute(
+                select(Promoter.id).where(Promoter.name == promoter_name)
+            ).scalar_one()
+        
+        self.promoter_cache[cache_key] = promoter_id
+        return promoter_id
+    
+    def link_ids(self, event_data: Dict) -> Tuple[List[int], List[int]]:
+        """Genre and promoter ids for an event, deduplicated (names differing in case share a row)
+        
+        Names are deduplicated before lookup and preloaded ids are read straight
+        from the caches; get_or_create_* only runs for names preload missed.
+        """
+        genre_cache = self.genre_cache
+        genre_ids = dict.fromkeys(
+            genre_cache.get(genre_name.lower()) or self.get_or_create_genre(genre_name)
+            for genre_name in dict.fromkeys(filter(None, event_data.get('genres', [])))
+        )
+        promoter_cache = self.promoter_cache
+        promoter_ids = dict.fromkeys(
+            promoter_cache.get(promoter_name.lower()) or self.get_or_create_promoter(promoter_name)
+            for promoter_name in dict.fromkeys(filter(None, event_data.get('promoters', [])))
+        )
+        return list(genre_ids), list(promoter_ids)
+    
+    def link_event(self, event_id: int, event_data: Dict):
+        """Bring an existing event's genre/promoter rows in line with the scraped data
+        
+        Only the difference against the links loaded up front is written, so
+        an unchanged event costs no association-table writes at all.
+        """
+        genre_ids, promoter_ids = self.link_ids(event_data)
+        
+        for table, column, wanted, links in (
+            (event_genres, event_genres.c.genre_id, genre_ids, self.event_genre_ids),
+            (event_promoters, event_promoters.c.promoter_id, promoter_ids, self.event_promoter_ids),
+        ):
+            have = links.get(event_id, set())
+            removed = have.difference(wanted)
+            if removed:
+                self.session.execute(
+                    delete(table).where(table.c.event_id == event_id, column.in_(removed))
+                )
+            added = [link_id for link_id in wanted if link_id not in have]
+            if added:
+                self.session.execute(table.insert(), [
+                    {'event_id': event_id, column.name: link_id} for link_id in added
+                ])
+            links[event_id] = set(wanted)
+    
+    def flush_new_events(self):
+        """Insert every queued new event and its links, one executemany per table
+        
+        Call before each commit. Event ids come back from RETURNING in
+        parameter order, then the link and association rows are written in
+        bulk against them.
+        """
+        if not self.pending:
+            return
+        
+        event_ids = self.session.execute(
+            Event.__table__.insert().returning(Event.id, sort_by_parameter_order=True),
+            [pending['row'] for pending in self.pending]
+        ).scalars().all()
+        
+        link_rows = []
+        genre_rows = []
+        promoter_rows = []
+        for event_id, pending in zip(event_ids, self.pending):
+            link_rows.extend({'event_id': event_id, **link} for link in pending['links'])
+            genre_rows.extend({'event_id': event_id, 'genre_id': genre_id} for genre_id in pending['genre_ids'])
+            promoter_rows.extend(
+                {'event_id': event_id, 'promoter_id': promoter_id} for promoter_id in pending['promoter_ids']
+            )
+            self.event_genre_ids[event_id] = set(pending['genre_ids'])
+            self.event_promoter_ids[event_id] = set(pending['promoter_ids'])
+            if pending['key'][0] is not None:
+                self.event_ids[pending['key']] = event_id
+        
+        for table, rows in (
+            (EventLink.__table__, link_rows),
+            (event_genres, genre_rows),
+            (event_promoters, promoter_rows),
+        ):
+            if rows:
+                self.session.execute(table.insert(), rows)
+        
+        logger.debug(f"Inserted {len(event_ids)} new events")
+        self.pending.clear()
+        self.pending_by_key.clear()
     
     def update_or_create_event(self, event_data: Dict, coordinates: Optional[Dict] = None) -> bool:
-        """Update existing event or create new one"""
+        """Update existing event or queue a new one for flush_new_events"""
         try:
             # Parse date
             date_str = event_data.get('dateISO')
             event_date = None
             if date_str:
-                event_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                event_date = date.fromisoformat(date_str)
             
-            # Check if event already exists
-            existing = self.session.query(Event).filter(
-                Event.title == event_data.get('title'),
-                Event.date == event_date
-            ).first()
+            # Check if event already exists (ids were loaded up front)
+            event_key = (event_data.get('title'), event_date)
+            existing_id = self.event_ids.get(event_key)
             
             # Get or create venue
-            venue = None
+            venue_id = None
             if event_data.get('venue'):
                 # Only pass coordinates if we need to update them
-                venue = self.get_or_create_venue(
+                venue_id = self.get_or_create_venue(
                     event_data['venue'],
                     event_data.get('city', 'San Francisco'),
                     coordinates
                 )
             
-            if existing:
+            if existing_id is not None:
                 # Update existing event
-                existing.url = event_data.get('url')
-                existing.time_range = event_data.get('timeRange')
-                existing.price = event_data.get('price')
-                existing.age_restriction = event_data.get('age')
-                existing.venue = venue
-                existing.updated_at = datetime.now()
-                
-                # Update genres
-                existing.genres.clear()
-                for genre_name in set(event_data.get('genres', [])):
-                    if genre_name:
-                        genre = self.get_or_create_genre(genre_name)
-                        existing.genres.append(genre)
+                self.session.execute(update(Event).where(Event.id == existing_id).values(
+                    url=event_data.get('url'),
+                    time_range=event_data.get('timeRange'),
+                    price=event_data.get('price'),
+                    age_restriction=event_data.get('age'),
+                    venue_id=venue_id,
+                    updated_at=datetime.now()
+                ))
                 
-                # Update promoters
-                existing.promoters.clear()
-                for promoter_name in event_data.get('promoters', []):
-                    if promoter_name:
-                        promoter = self.get_or_create_promoter(promoter_name)
-                        existing.promoters.append(promoter)
+                # Sync genres and promoters
+                self.link_event(existing_id, event_data)
                 
-                logger.debug(f"Updated event: {existing.title}")
+                logger.debug(f"Updated event: {event_data.get('title')}")
                 return False  # Not new
             
-            else:
-                # Create new event
-                event = Event(
-                    title=event_data.get('title', 'Untitled Event'),
+            genre_ids, promoter_ids = self.link_ids(event_data)
+            
+            queued = self.pending_by_key.get(event_key) if event_key[0] is not None else None
+            if queued is not None:
+                # Repeat of an event queued earlier in this batch: update it in place
+                queued['row'].update(
                     url=event_data.get('url'),
-                    hidden=event_data.get('hidden', False),
-                    date=event_date,
-                    day_label=event_data.get('dayLabel'),
                     time_range=event_data.get('timeRange'),
-                    venue=venue,
                     price=event_data.get('price'),
                     age_restriction=event_data.get('age'),
-                    original_json=json.dumps(event_data),
-                    source='19hz'
+                    venue_id=venue_id
                 )
-                
-                # Add genres
-                for genre_name in set(event_data.get('genres', [])):
-                    if genre_name:
-                        genre = self.get_or_create_genre(genre_name)
-                        event.genres.append(genre)
-                
-                # Add promoters
-                for promoter_name in event_data.get('promoters', []):
-                    if promoter_name:
-                        promoter = self.get_or_create_promoter(promoter_name)
-                        event.promoters.append(promoter)
-                
-                # Add extra links
-                for link_data in event_data.get('extraLinks', []):
-                    if link_data.get('href'):
-                        link = EventLink(
-                            text=link_data.get('text', ''),
-                            href=link_data['href']
-                        )
-                        event.extra_links.append(link)
-                
-                self.session.add(event)
-                # Flush after adding the event with all its relationships
-                self.session.flush()
-                logger.debug(f"Created new event: {event.title}")
-                return True  # New event
+                queued['genre_ids'] = genre_ids
+                queued['promoter_ids'] = promoter_ids
+                logger.debug(f"Updated event: {event_data.get('title')}")
+                return False  # Not new
+            
+            # Queue new event; flush_new_events writes the batch
+            pending = {
+                'key': event_key,
+                'row': {
+                    'title': event_data.get('title', 'Untitled Event'),
+                    'url': event_data.get('url'),
+                    'hidden': event_data.get('hidden', False),
+                    'date': event_date,
+                    'day_label': event_data.get('dayLabel'),
+                    'time_range': event_data.get('timeRange'),
+                    'venue_id': venue_id,
+                    'price': event_data.get('price'),
+                    'age_restriction': event_data.get('age'),
+                    'original_json': pack_original_json(event_data),
+                    'source': '19hz'
+                },
+                'links': [
+                    {'text': link_data.get('text', ''), 'href': link_data['href']}
+                    for link_data in event_data.get('extraLinks', []) if link_data.get('href')
+                ],
+                'genre_ids': genre_ids,
+                'promoter_ids': promoter_ids
+            }
+            self.pending.append(pending)
+            if event_key[0] is not None:
+                self.pending_by_key[event_key] = pending
+            logger.debug(f"Queued new event: {pending['row']['title']}")
+            return True  # New event
                 
         except Exception as e:
             logger.error(f"Error updating/creating event: {e}")
@@ -457,6 +728,8 @@ async def scrape_and_update(days_ahead: Optional[int] = None) -> Dict:
         days_ahead=days_ahead
     )
     
+    scraper = None
+    engine = None
     try:
         # Initialize scraper
         scraper = EventScraper()
@@ -465,110 +738,112 @@ async def scrape_and_update(days_ahead: Optional[int] = None) -> Dict:
         logger.info("Fetching HTML from 19hz.info...")
         html_content = scraper.fetch_html()
         
+        # Parse only events within the specified timeframe (undated rows are kept)
         logger.info("Parsing events...")
-        all_events = scraper.parse_events(html_content)
+        today = date.today()
+        cutoff_date = today + timedelta(days=days_ahead)
+        events = scraper.parse_events(html_content, (today, cutoff_date))
+        total_events = len(events) + scraper.out_of_range
         
-        # Filter events to only process those within the specified timeframe
-        cutoff_date = (datetime.now() + timedelta(days=days_ahead)).date()
-        today = datetime.now().date()
-        events = []
-        for event in all_events:
-            date_str = event.get('dateISO')
-            if date_str:
-                try:
-                    event_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                    if today <= event_date <= cutoff_date:
-                        events.append(event)
-                except ValueError:
-                    # If date parsing fails, include it anyway
-                    events.append(event)
-            else:
-                # If no date, include it
-                events.append(event)
-        
-        logger.info(f"Filtered to {len(events)} events (out of {len(all_events)} total) for next {days_ahead} days")
+        logger.info(f"Filtered to {len(events)} events (out of {total_events} total) for next {days_ahead} days")
         
         logfire.info(
             'Events filtered',
             service='scraper',
             event_type='events_filtered',
-            total_events=len(all_events),
+            total_events=total_events,
             filtered_events=len(events),
             days_ahead=days_ahead
         )
         
         # Connect to database
-        engine = create_engine("sqlite:///events.db", echo=False)
-        Base.metadata.create_all(engine)
+        # (create_database turns on WAL, synchronous=NORMAL and the cache/mmap pragmas)
+        engine = create_database("events.db")
         session = get_session(engine)
-        
-        # Initialize database updater
-        updater = DatabaseUpdater(session)
-        
-        # Load existing venues to check if we already have coordinates
-        venue_coords_cache = {}
-        existing_venues = session.query(Venue).filter(
-            Venue.latitude.isnot(None),
-            Venue.longitude.isnot(None)
-        ).all()
-        for v in existing_venues:
-            cache_key = f"{v.name}|{v.city}"
-            venue_coords_cache[cache_key] = {
-                'lat': v.latitude,
-                'lon': v.longitude,
-                'display_name': v.display_name,
-                'approximate': v.is_approximate
+        try:
+            # Initialize database updater and create all genres/promoters up front
+            updater = DatabaseUpdater(session)
+            updater.preload(events)
+            session.commit()
+            
+            # Load existing venues to check if we already have coordinates
+            # (plain column tuples; no Venue objects are built)
+            venue_coords_cache = {
+                (name, city): {
+                    'lat': latitude,
+                    'lon': longitude,
+                    'display_name': display_name,
+                    'approximate': is_approximate
+                }
+                for name, city, latitude, longitude, display_name, is_approximate in session.execute(
+                    select(
+                        Venue.name, Venue.city, Venue.latitude, Venue.longitude,
+                        Venue.display_name, Venue.is_approximate
+                    ).where(Venue.latitude.isnot(None), Venue.longitude.isnot(None))
+                )
             }
-        logger.info(f"Loaded {len(venue_coords_cache)} venues with existing coordinates")
-        
-        # Process events
-        new_count = 0
-        updated_count = 0
-        geocoded_count = 0
-        
-        for i, event_data in enumerate(events, 1):
-            if i % 10 == 0:
-                logger.info(f"Processing event {i}/{len(events)}...")
+            logger.info(f"Loaded {len(venue_coords_cache)} venues with existing coordinates")
             
-            try:
+            # Geocode every venue still lacking coordinates up front, concurrently
+            # under the 1 req/s limit, so the event loop below is pure DB work
+            needed = dict.fromkeys(
+                (event_data['venue'], event_data.get('city', 'San Francisco'))
+                for event_data in events
+                if event_data.get('venue') and 'TBA' not in event_data['venue']
+            )
+            to_geocode = [
+                (venue_name, city) for venue_name, city in needed
+                if (venue_name, city) not in venue_coords_cache
+            ]
+            geocoded_count = 0
+            if to_geocode:
+                logger.info(f"Geocoding {len(to_geocode)} new venues...")
+                for (venue_name, city), coordinates in zip(to_geocode, await scraper.geocode_many(to_geocode)):
+                    if coordinates:
+                        venue_coords_cache[(venue_name, city)] = coordinates
+                        geocoded_count += 1
+            
+            # Process events
+            new_count = 0
+            updated_count = 0
+            
+            for i, event_data in enumerate(events, 1):
+                if i % 10 == 0:
+                    logger.info(f"Processing event {i}/{len(events)}...")
+                
                 # Check if we need to geocode the venue
                 coordinates = None
                 venue_name = event_data.get('venue')
                 city = event_data.get('city', 'San Francisco')
                 
                 if venue_name and 'TBA' not in venue_name:
-                    cache_key = f"{venue_name}|{city}"
-                    
-                    # Check if we already have coordinates for this venue
-                    if cache_key in venue_coords_cache:
-                        coordinates = venue_coords_cache[cache_key]
-                        logger.debug(f"Using cached coordinates for {venue_name}")
-                    else:
-                        # Only geocode if we don't have coordinates yet
-                        coordinates = scraper.geocode_venue(venue_name, city)
-                        if coordinates:
-                            venue_coords_cache[cache_key] = coordinates
-                            geocoded_count += 1
+                    coordinates = venue_coords_cache.get((venue_name, city))
+                
+                # Each event gets a savepoint, so a failure only undoes that event
+                savepoint = session.begin_nested()
+                try:
+                    is_new = updater.update_or_create_event(event_data, coordinates)
+                    savepoint.commit()
+                except Exception as e:
+                    logger.error(f"Error processing event {i}: {e}")
+                    updater.discard_event(savepoint)
+                    continue
                 
-                # Update or create event
-                is_new = updater.update_or_create_event(event_data, coordinates)
                 if is_new:
                     new_count += 1
                 else:
                     updated_count += 1
                 
-                # Commit periodically
-                if i % 20 == 0:
+                # Write queued new events and commit periodically
+                if i % COMMIT_EVERY == 0:
+                    updater.flush_new_events()
                     session.commit()
-                    
-            except Exception as e:
-                logger.error(f"Error processing event {i}: {e}")
-                session.rollback()
-                continue
-        
-        # Final commit
-        session.commit()
-        session.close()
+            
+            # Final commit
+            updater.flush_new_events()
+            session.commit()
+        finally:
+            session.close()
         
         logger.info(f"Scraping complete! New events: {new_count}, Updated: {updated_count}, Geocoded venues: {geocoded_count}")
         
@@ -584,21 +859,30 @@ async def scrape_and_update(days_ahead: Optional[int] = None) -> Dict:
         )
         
         # Clean up old events (older than 6 months)
-        cutoff_date = datetime.now().date() - timedelta(days=180)
+        cutoff_date = date.today() - timedelta(days=180)
         session = get_session(engine)
-        old_events = session.query(Event).filter(Event.date < cutoff_date).count()
-        if old_events > 0:
-            session.query(Event).filter(Event.date < cutoff_date).delete()
+        try:
+            old_events = session.query(Event).filter(Event.date < cutoff_date).count()
+            if old_events > 0:
+                session.query(Event).filter(Event.date < cutoff_date).delete()
+                session.commit()
+                logger.info(f"Cleaned up {old_events} old events")
+                logfire.info(
+                    'Old events cleaned',
+                    service='scraper',
+                    event_type='cleanup',
+                    events_removed=old_events,
+                    cutoff_date=cutoff_date.isoformat()
+                )
+            
+            # Refresh the full-text search index, the per-name event counts and
+            # the planner statistics from the updated tables
+            total_events = rebuild_search_index(session)
+            refresh_name_stats(session)
+            session.execute(text("ANALYZE"))
             session.commit()
-            logger.info(f"Cleaned up {old_events} old events")
-            logfire.info(
-                'Old events cleaned',
-                service='scraper',
-                event_type='cleanup',
-                events_removed=old_events,
-                cutoff_date=cutoff_date.isoformat()
-            )
-        session.close()
+        finally:
+            session.close()
         
         # Return statistics
         return {
@@ -606,6 +890,7 @@ async def scrape_and_update(days_ahead: Optional[int] = None) -> Dict:
             'updated_events': updated_count,
             'geocoded_venues': geocoded_count,
             'total_processed': len(events),
+            'total_events': total_events,
             'days_ahead': days_ahead
         }
         
@@ -618,20 +903,12 @@ async def scrape_and_update(days_ahead: Optional[int] = None) -> Dict:
             error=str(e)
         )
         raise
-
-
-# Background task runner
-async def run_periodic_scraping():
-    """Run scraping periodically"""
-    while True:
-        try:
-            # Process events based on configured days ahead (defaults to 14)
-            await scrape_and_update()
-        except Exception as e:
-            logger.error(f"Periodic scraping error: {e}")
-        
-        # Wait 12 hours
-        await asyncio.sleep(12 * 60 * 60)
+    finally:
+        # Release the geocode cache and pooled connections even when a step failed
+        if scraper is not None:
+            scraper.geocode_cache.close()
+        if engine is not None:
+            engine.dispose()
 
 
 if __name__ == "__main__":
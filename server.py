@@ -1,22 +1,29 @@
 #!/usr/bin/env python3
 """FastAPI server for SF Bay Area Events"""
 
-import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime, date
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, ORJSONResponse, Response
 from pydantic import BaseModel
+import orjson
 import uvicorn
 
 # Initialize FastAPI app
 app = FastAPI(
     title="SF Events API",
     description="API for SF Bay Area events with geocoding",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -28,6 +35,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON bodies over 1 KB for clients that accept gzip; responses that
+# already carry a Content-Encoding are passed through untouched
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Data models
 class EventLocation(BaseModel):
     lat: float
@@ -53,39 +64,120 @@ class Event(BaseModel):
     coordinates: Optional[EventLocation] = None
 
 # Load events data
-def load_events() -> List[Dict[str, Any]]:
-    """Load events from the geocoded JSON file"""
-    # Try geocoded file first
-    geocoded_file = Path("events_all_geocoded.json")
-    if geocoded_file.exists():
-        with open(geocoded_file, 'r') as f:
-            return json.load(f)
+# Geocoded file first, then the latest parsed file, then the original file
+EVENT_FILES = (
+    Path("events_all_geocoded.json"),
+    Path("19hz_events_latest.json"),
+    Path("events-2025-08-29T19-48-28.json")
+)
+
+def events_source() -> Optional[Tuple[Path, int]]:
+    """The file load_events() would read, with its mtime, or None"""
+    for path in EVENT_FILES:
+        try:
+            return path, path.stat().st_mtime_ns
+        except OSError:
+            continue
+    return None
+
+def load_events(source: Optional[Tuple[Path, int]] = None) -> List[Dict[str, Any]]:
+    """Load events from the geocoded JSON file (or the given events_source())"""
+    source = source or events_source()
+    if source is None:
+        return []
+    return orjson.loads(source[0].read_bytes())
+
+@lru_cache(maxsize=1024)
+def _weekday(date_iso: str) -> Optional[int]:
+    """Weekday of an ISO date string, or None if there is no date"""
+    if not date_iso:
+        return None
+    try:
+        return date.fromisoformat(date_iso).weekday()
+    except ValueError:
+        return None
+
+def build_columns(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Lay the filterable event fields out column by column
     
-    # Fall back to latest parsed file
-    latest_file = Path("19hz_events_latest.json")
-    if latest_file.exists():
-        with open(latest_file, 'r') as f:
-            return json.load(f)
+    Each column is indexed by the event's position in the cache. Dates are
+    also kept sorted, with the matching positions in 'order', so a date
+    range is two bisects instead of a scan. 'genre_index' maps each
+    lowercased genre to the positions of the events that carry it.
+    """
+    dates = [e.get('dateISO') or '' for e in events]
+    order = sorted(range(len(events)), key=dates.__getitem__)
+    weekdays = [_weekday(d) for d in dates]
+    genre_index = defaultdict(set)
+    for i, e in enumerate(events):
+        for g in e.get('genres', []):
+            genre_index[g.lower()].add(i)
+    return {
+        'sorted_dates': [dates[i] for i in order],
+        'order': order,
+        'hidden': [bool(e.get('hidden', False)) for e in events],
+        'title_lower': [(e.get('title') or '').lower() for e in events],
+        'venue_lower': [(e.get('venue') or '').lower() for e in events],
+        'city_lower': [(e.get('city') or '').lower() for e in events],
+        'genre_index': dict(genre_index),
+        'weekday': weekdays,
+        # Friday, Saturday, Sunday
+        'weekend': [i for i, wd in enumerate(weekdays) if wd is not None and wd >= 4]
+    }
+
+def genre_matches(columns: Dict[str, Any], genre_lower: str) -> set:
+    """Positions of events with a genre containing genre_lower
+    
+    Only the distinct genre names are scanned, not every event.
+    """
+    hits = set()
+    for name, positions in columns['genre_index'].items():
+        if genre_lower in name:
+            hits |= positions
+    return hits
+
+class EventSnapshot:
+    """Events loaded from one (file, mtime), with the columns built from them
     
-    # Fall back to original file
-    original_file = Path("events-2025-08-29T19-48-28.json")
-    if original_file.exists():
-        with open(original_file, 'r') as f:
-            return json.load(f)
+    Handlers take one snapshot and read only from it, so a reload on another
+    thread can't pair old events with new columns. Hashes by identity, which
+    keys search_json's cache per snapshot.
+    """
+    __slots__ = ('source', 'events', 'columns', 'stats')
     
-    return []
+    def __init__(self, source: Optional[Tuple[Path, int]], events: List[Dict[str, Any]]):
+        self.source = source
+        self.events = events
+        self.columns = build_columns(events)
+        # Encoded /api/events/stats body, filled on first request
+        self.stats = None
 
-# Cache events in memory
-EVENTS_CACHE = None
+# Current snapshot; only ever replaced whole, under SNAPSHOT_LOCK
+SNAPSHOT: Optional[EventSnapshot] = None
+SNAPSHOT_LOCK = threading.Lock()
 
-def get_events_cached() -> List[Dict[str, Any]]:
-    """Get cached events or load them"""
-    global EVENTS_CACHE
-    if EVENTS_CACHE is None:
-        EVENTS_CACHE = load_events()
-    return EVENTS_CACHE
+def get_snapshot(force: bool = False) -> EventSnapshot:
+    """Current events snapshot, reloading it if the source file has changed
+    
+    Checking the mtime keeps every worker process current without having to
+    reach each one with /api/refresh.
+    """
+    global SNAPSHOT
+    source = events_source()
+    snapshot = SNAPSHOT
+    if not force and snapshot is not None and snapshot.source == source:
+        return snapshot
+    
+    with SNAPSHOT_LOCK:
+        # Another thread may have reloaded while this one waited
+        if force or SNAPSHOT is None or SNAPSHOT.source != source:
+            SNAPSHOT = EventSnapshot(source, load_events(source))
+            search_json.cache_clear()
+        return SNAPSHOT
 
 # API Routes
+# Handlers that only do in-memory work or blocking file reads are plain def,
+# so FastAPI runs them in its threadpool instead of on the event loop
 @app.get("/")
 async def read_root():
     """Serve the main HTML file"""
@@ -94,8 +186,8 @@ async def read_root():
         return FileResponse("index_v2.html")
     return FileResponse("index.html")
 
-@app.get("/api/events", response_model=List[Dict[str, Any]])
-async def get_events(
+@app.get("/api/events")
+def get_events(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     city: Optional[str] = Query(None, description="Filter by city"),
@@ -105,98 +197,112 @@ async def get_events(
     limit: Optional[int] = Query(None, description="Limit number of results")
 ):
     """Get all events with optional filters"""
-    events = get_events_cached()
-    
-    # Filter out hidden events unless requested
-    if not hidden:
-        events = [e for e in events if not e.get('hidden', False)]
-    
-    # Apply filters
-    if start_date:
-        events = [e for e in events if e.get('dateISO', '') >= start_date]
-    
-    if end_date:
-        events = [e for e in events if e.get('dateISO', '') <= end_date]
+    snapshot = get_snapshot()
+    events = snapshot.events
+    columns = snapshot.columns
     
-    if city:
-        events = [e for e in events if e.get('city', '').lower() == city.lower()]
+    # Narrow to the date range by bisecting the sorted dates, then put the
+    # matches back in cache order
+    if start_date or end_date:
+        sorted_dates = columns['sorted_dates']
+        lo = bisect_left(sorted_dates, start_date) if start_date else 0
+        hi = bisect_right(sorted_dates, end_date) if end_date else len(sorted_dates)
+        indices = sorted(columns['order'][lo:hi])
+    else:
+        indices = range(len(events))
     
-    if genre:
-        genre_lower = genre.lower()
-        events = [e for e in events 
-                 if any(genre_lower in g.lower() for g in e.get('genres', []))]
+    # Lowercase the filter values once, then check every predicate in a
+    # single pass, stopping as soon as the limit is reached
+    is_hidden = columns['hidden']
+    cities = columns['city_lower']
+    weekdays = columns['weekday']
+    city_lower = city.lower() if city else None
+    genre_hits = genre_matches(columns, genre.lower()) if genre else None
     
-    if day_of_week is not None:
-        events = [e for e in events 
-                 if e.get('dateISO') and 
-                 datetime.strptime(e['dateISO'], '%Y-%m-%d').weekday() == day_of_week]
-    
-    # Apply limit
-    if limit:
-        events = events[:limit]
+    result = []
+    for i in indices:
+        if not hidden and is_hidden[i]:
+            continue
+        if city and cities[i] != city_lower:
+            continue
+        if genre and i not in genre_hits:
+            continue
+        if day_of_week is not None and weekdays[i] != day_of_week:
+            continue
+        result.append(events[i])
+        if limit and len(result) == limit:
+            break
     
-    return events
+    return result[:limit] if limit else result
 
 @app.get("/api/events/today")
-async def get_todays_events():
+def get_todays_events():
     """Get today's events"""
     today = date.today().isoformat()
-    return await get_events(start_date=today, end_date=today)
+    # Pass every filter explicitly; the defaults are Query() markers outside a request
+    return get_events(
+        start_date=today, end_date=today, city=None, genre=None,
+        day_of_week=None, hidden=False, limit=None
+    )
 
 @app.get("/api/events/weekend")
-async def get_weekend_events():
+def get_weekend_events():
     """Get this weekend's events (Friday-Sunday)"""
-    events = get_events_cached()
-    weekend_events = []
-    
-    for event in events:
-        if event.get('dateISO'):
-            try:
-                event_date = datetime.strptime(event['dateISO'], '%Y-%m-%d')
-                if event_date.weekday() in [4, 5, 6]:  # Friday, Saturday, Sunday
-                    weekend_events.append(event)
-            except:
-                pass
+    snapshot = get_snapshot()
+    events = snapshot.events
     
-    return weekend_events
+    # Weekend positions are worked out once when the snapshot loads
+    return [events[i] for i in snapshot.columns['weekend']]
 
 @app.get("/api/events/stats")
-async def get_stats():
+def get_stats():
     """Get statistics about the events"""
-    events = get_events_cached()
-    visible_events = [e for e in events if not e.get('hidden', False)]
-    
-    # Get unique values
-    cities = list(set(e.get('city', '') for e in visible_events if e.get('city')))
-    venues = list(set(e.get('venue', '') for e in visible_events if e.get('venue')))
-    all_genres = []
-    for e in visible_events:
-        all_genres.extend(e.get('genres', []))
-    genres = list(set(all_genres))
+    snapshot = get_snapshot()
+    if snapshot.stats is not None:
+        return Response(snapshot.stats, media_type="application/json")
+    events = snapshot.events
     
-    # Date range
-    dates = [e['dateISO'] for e in visible_events if e.get('dateISO')]
-    dates.sort()
+    # Gather everything in one pass over the visible events
+    cities, venues, genres = set(), set(), set()
+    visible = 0
+    start = end = None
+    for e in events:
+        if e.get('hidden', False):
+            continue
+        visible += 1
+        if e.get('city'):
+            cities.add(e['city'])
+        if e.get('venue'):
+            venues.add(e['venue'])
+        genres.update(e.get('genres', []))
+        # Date range, tracked as we go
+        d = e.get('dateISO')
+        if d:
+            if start is None or d < start:
+                start = d
+            if end is None or d > end:
+                end = d
     
-    return {
+    snapshot.stats = orjson.dumps({
         "total_events": len(events),
-        "visible_events": len(visible_events),
-        "hidden_events": len(events) - len(visible_events),
+        "visible_events": visible,
+        "hidden_events": len(events) - visible,
         "unique_cities": len(cities),
         "unique_venues": len(venues),
         "unique_genres": len(genres),
         "date_range": {
-            "start": dates[0] if dates else None,
-            "end": dates[-1] if dates else None
+            "start": start,
+            "end": end
         },
         "cities": sorted(cities),
         "genres": sorted(genres)
-    }
+    })
+    return Response(snapshot.stats, media_type="application/json")
 
 @app.get("/api/venues")
-async def get_venues():
+def get_venues():
     """Get all unique venues with their locations"""
-    events = get_events_cached()
+    events = get_snapshot().events
     venues = {}
     
     for event in events:
@@ -211,46 +317,48 @@ async def get_venues():
                 }
             venues[key]['event_count'] += 1
     
-    return list(venues.values())
+    return ORJSONResponse(list(venues.values()))
 
 @app.post("/api/refresh")
-async def refresh_data():
+def refresh_data():
     """Refresh the events cache"""
-    global EVENTS_CACHE
-    EVENTS_CACHE = None
-    events = get_events_cached()
+    events = get_snapshot(force=True).events
     return {"status": "success", "events_loaded": len(events)}
 
 @app.get("/api/search")
-async def search_events(
+def search_events(
     q: str = Query(..., description="Search query"),
     field: Optional[str] = Query("all", description="Field to search (title, venue, genre, all)")
 ):
     """Search events by text"""
-    events = get_events_cached()
+    return Response(search_json(get_snapshot(), q, field), media_type="application/json")
+
+@lru_cache(maxsize=512)
+def search_json(snapshot: EventSnapshot, q: str, field: Optional[str]) -> bytes:
+    """Encoded search results for one snapshot, cached per (query, field)"""
+    events = snapshot.events
+    columns = snapshot.columns
     query = q.lower()
+    match_title = field == "title" or field == "all"
+    match_venue = field == "venue" or field == "all"
+    match_genre = field == "genre" or field == "all"
+    
+    # Match against the lowercased columns built with the cache
+    is_hidden = columns['hidden']
+    titles = columns['title_lower']
+    venues = columns['venue_lower']
+    genre_hits = genre_matches(columns, query) if match_genre else ()
     results = []
     
-    for event in events:
-        if event.get('hidden'):
+    for i, event in enumerate(events):
+        if is_hidden[i]:
             continue
-            
-        if field == "title" or field == "all":
-            if query in event.get('title', '').lower():
-                results.append(event)
-                continue
-        
-        if field == "venue" or field == "all":
-            if query in event.get('venue', '').lower():
-                results.append(event)
-                continue
-        
-        if field == "genre" or field == "all":
-            if any(query in g.lower() for g in event.get('genres', [])):
-                results.append(event)
-                continue
+        if ((match_title and query in titles[i])
+                or (match_venue and query in venues[i])
+                or i in genre_hits):
+            results.append(event)
     
-    return results
+    return orjson.dumps(results)
 
 # Serve static files
 @app.get("/events_all_geocoded.json")
@@ -277,15 +385,21 @@ async def get_tba_json():
         return FileResponse(file_path)
     raise HTTPException(status_code=404, detail="TBA events file not found")
 
+@lru_cache(maxsize=256)
+def _date_file_json(path: str, mtime_ns: int) -> bytes:
+    """Compact JSON body for a per-date file, cached until the file changes"""
+    return orjson.dumps(orjson.loads(Path(path).read_bytes()))
+
 @app.get("/api/events/by-date/{date}")
-async def get_events_by_date(date: str):
+def get_events_by_date(date: str):
     """Get events for a specific date"""
+    # Plain def: the file read runs in the threadpool, off the event loop
     file_path = Path(f"events_by_date/events_{date}.json")
-    if file_path.exists():
-        with open(file_path, 'r') as f:
-            events = json.load(f)
-        return events
-    return []
+    try:
+        mtime_ns = file_path.stat().st_mtime_ns
+    except OSError:
+        return Response(b'[]', media_type="application/json")
+    return Response(_date_file_json(str(file_path), mtime_ns), media_type="application/json")
 
 @app.get("/health")
 async def health_check():
@@ -293,8 +407,14 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 # Run with: poetry run python server.py
+# (WEB_CONCURRENCY=4 poetry run python server.py for several workers)
 if __name__ == "__main__":
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
     print("🚀 Starting SF Events API server...")
     print("📍 API docs: http://localhost:8001/docs")
     print("🗺️  Map view: http://localhost:8001")
-    uvicorn.run("server:app", host="0.0.0.0", port=8001, reload=True)
\ No newline at end of file
+    # Uvicorn can't reload with multiple workers, so reload is single-worker only
+    uvicorn.run(
+        "server:app", host="0.0.0.0", port=8001, reload=workers == 1, workers=workers,
+        loop="uvloop", http="httptools"
+    )
\ No newline at end of file
@@ -1,28 +1,36 @@
 #!/usr/bin/env python3
 """FastAPI server for SF Bay Area Events using SQLAlchemy database"""
 
+import gzip
 import json
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
 from datetime import datetime, date, timedelta
 from typing import List, Optional, Dict, Any
 from fastapi import FastAPI, HTTPException, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, ORJSONResponse, Response
 import os
+import time
 import asyncio
 import logging
+import orjson
 from pydantic import BaseModel
-from sqlalchemy import create_engine, and_, or_, func
-from sqlalchemy.orm import Session, sessionmaker, joinedload
+from sqlalchemy import false, func, select, text
+from sqlalchemy.orm import Session, sessionmaker
 import uvicorn
 import logfire
 
 from models import (
-    Event, Venue, Genre, Promoter, EventLink, TBAVenueHint,
-    EventQueries, create_database, get_session
+    Event, Venue, Genre, Promoter, EventLink, TBAVenueHint, GenreStat, PromoterStat,
+    EventQueries, create_database, event_genres, event_promoters,
+    rebuild_search_index, refresh_name_stats, schema_is_current, sqlite_engine
 )
-from scraper_service import scrape_and_update, run_periodic_scraping
+from scraper_service import scrape_and_update
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -39,7 +47,8 @@ else:
 app = FastAPI(
     title="SF Events API (SQLite)",
     description="API for SF Bay Area events using SQLAlchemy and SQLite",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Instrument FastAPI with Logfire if configured
@@ -55,17 +64,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON bodies over 1 KB for clients that accept gzip; responses that
+# already carry a Content-Encoding are passed through untouched
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Database setup
 DATABASE_URL = "sqlite:///events.db"
-engine = create_engine(DATABASE_URL, echo=False)
+# Sync handlers run on AnyIO's threadpool (40 threads by default); keep enough
+# pooled connections that they don't queue for one or reconnect as overflow
+engine = sqlite_engine(DATABASE_URL, pool_size=20, max_overflow=20)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Background task reference
 background_tasks = set()
 # Scraping status
 scraping_status = {"is_scraping": False, "last_scrape": None, "events_count": 0}
-
-# Dependency to get DB session
+# Encoded /events_organized.json body (and its gzipped form), rebuilt on the
+# first request after a scrape
+ORGANIZED_CACHE = None
+ORGANIZED_GZIP = None
+# Encoded bodies of the other read-heavy endpoints, keyed on endpoint and
+# the arguments that shape the response
+RESPONSE_CACHE: Dict[tuple, bytes] = {}
+# Version of the data behind the read endpoints: this process's start time
+# plus the scrapes it has finished since, used as their ETag
+DATA_VERSION = [format(time.time_ns(), 'x'), 0]
+ETAG_PATHS = ("/api/events", "/api/venues", "/api/genres", "/api/promoters", "/api/search",
+              "/events_organized.json", "/events_tba.json")
+CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=60"
+
+def invalidate_response_caches():
+    """Drop cached responses once a scrape has changed the database"""
+    global ORGANIZED_CACHE, ORGANIZED_GZIP
+    ORGANIZED_CACHE = ORGANIZED_GZIP = None
+    RESPONSE_CACHE.clear()
+    DATA_VERSION[1] += 1
+
+@app.middleware("http")
+async def etag_middleware(request: Request, call_next):
+    """Tag read responses with the data version and answer repeat polls with 304"""
+    if request.method != "GET" or not request.url.path.startswith(ETAG_PATHS):
+        return await call_next(request)
+    
+    # Weak, since gzip and identity bodies share it; dated so that
+    # /today and /weekend roll over at midnight
+    etag = f'W/"{DATA_VERSION[0]}-{DATA_VERSION[1]}-{date.today().isoformat()}"'
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+def cached_json(key: tuple, build) -> Response:
+    """Serve the cached body for key, encoding build()'s result on a miss"""
+    body = RESPONSE_CACHE.get(key)
+    if body is None:
+        body = RESPONSE_CACHE[key] = orjson.dumps(build())
+    return Response(body, media_type="application/json")
+
+# Dependency to get DB session. Handlers that take one are plain def, so
+# FastAPI runs their blocking queries on the threadpool, not the event loop
 def get_db():
     db = SessionLocal()
     try:
@@ -79,8 +140,23 @@ async def startup_event():
     logger.info("Starting up SF Events API...")
     logfire.info('SF Events API starting up', service='api', event_type='startup')
     
-    # Create database if it doesn't exist
-    create_database("events.db")
+    # Create the database, or bring an older one up to the current schema;
+    # a normal boot only reads sqlite_master
+    if not schema_is_current(engine):
+        create_database("events.db")
+    
+    # Count genres and promoters and fill the search index now rather than
+    # waiting for the first scrape (an index left empty by an older build
+    # would otherwise make /api/search return nothing), and let SQLite
+    # refresh any planner statistics that need it
+    db = SessionLocal()
+    try:
+        refresh_name_stats(db)
+        rebuild_search_index(db)
+        db.commit()
+        db.execute(text("PRAGMA optimize"))
+    finally:
+        db.close()
     
     # Schedule initial scraping to run in background (don't block startup)
     async def initial_scrape():
@@ -93,11 +169,8 @@ async def startup_event():
             result = await scrape_and_update()
             logger.info("Initial scraping completed successfully")
             scraping_status["last_scrape"] = datetime.now().isoformat()
-            # Get event count
-            db = SessionLocal()
-            event_count = db.query(Event).count()
-            scraping_status["events_count"] = event_count
-            db.close()
+            # The scraper counted the events while rebuilding the search index
+            event_count = scraping_status["events_count"] = result['total_events']
             
             logfire.info(
                 'Initial scraping completed',
@@ -110,17 +183,15 @@ async def startup_event():
             logger.error(f"Initial scraping failed: {e}")
         finally:
             scraping_status["is_scraping"] = False
+            invalidate_response_caches()
     
     # Start initial scraping in background
     task = asyncio.create_task(initial_scrape())
     background_tasks.add(task)
     task.add_done_callback(background_tasks.discard)
     
-    # Start periodic scraping task (will process next 14 days every 12 hours)
-    task = asyncio.create_task(run_periodic_scraping())
-    background_tasks.add(task)
-    task.add_done_callback(background_tasks.discard)
-    logger.info("Background scraping task started (runs every 12 hours)")
+    # Later scrapes come from the sf-events-scraper cron job (run_scraper.py),
+    # which POSTs /api/scrape every 12 hours, so nothing stays resident here
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -155,6 +226,75 @@ class EventResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# The columns behind Event.to_dict(), read as plain rows so list endpoints
+# skip ORM object hydration and identity-map bookkeeping
+EVENT_ROWS = select(
+    Event.id, Event.title, Event.url, Event.hidden, Event.date, Event.day_label,
+    Event.time_range, Event.price, Event.age_restriction,
+    Venue.name.label('venue'), Venue.city, Venue.latitude, Venue.longitude,
+    Venue.display_name, Venue.is_approximate
+).outerjoin(Venue, Event.venue_id == Venue.id)
+
+def event_dicts(db: Session, stmt) -> List[Dict[str, Any]]:
+    """Run an EVENT_ROWS select and shape each row like Event.to_dict()
+    
+    Genres, promoters and links come from one IN query each, in the same
+    primary-key order the ORM relationships load them.
+    """
+    rows = db.execute(stmt).all()
+    ids = [row.id for row in rows]
+    genres = defaultdict(list)
+    promoters = defaultdict(list)
+    links = defaultdict(list)
+    
+    if ids:
+        for event_id, name in db.execute(
+            select(event_genres.c.event_id, Genre.name)
+            .join(Genre, Genre.id == event_genres.c.genre_id)
+            .where(event_genres.c.event_id.in_(ids))
+            .order_by(event_genres.c.event_id, event_genres.c.genre_id)
+        ):
+            genres[event_id].append(name)
+        for event_id, name in db.execute(
+            select(event_promoters.c.event_id, Promoter.name)
+            .join(Promoter, Promoter.id == event_promoters.c.promoter_id)
+            .where(event_promoters.c.event_id.in_(ids))
+            .order_by(event_promoters.c.event_id, event_promoters.c.promoter_id)
+        ):
+            promoters[event_id].append(name)
+        for event_id, link_text, href in db.execute(
+            select(EventLink.event_id, EventLink.text, EventLink.href)
+            .where(EventLink.event_id.in_(ids))
+            .order_by(EventLink.id)
+        ):
+            links[event_id].append({'text': link_text, 'href': href})
+    
+    return [
+        {
+            'id': row.id,
+            'title': row.title,
+            'url': row.url,
+            'hidden': row.hidden,
+            'dateISO': row.date.isoformat() if row.date else None,
+            'dayLabel': row.day_label,
+            'timeRange': row.time_range,
+            'venue': row.venue,
+            'city': row.city,
+            'coordinates': {
+                'lat': row.latitude,
+                'lon': row.longitude,
+                'display_name': row.display_name,
+                'approximate': row.is_approximate
+            } if row.latitude else None,
+            'price': row.price,
+            'age': row.age_restriction,
+            'genres': genres[row.id],
+            'promoters': promoters[row.id],
+            'extraLinks': links[row.id]
+        }
+        for row in rows
+    ]
+
 # API Routes
 @app.get("/")
 async def read_root(request: Request):
@@ -173,11 +313,13 @@ async def read_root(request: Request):
         return FileResponse("index_v2.html")
     return FileResponse("index.html")
 
-@app.get("/api/events", response_model=List[EventResponse])
-async def get_events(
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    date: Optional[str] = Query(None, description="Specific date (YYYY-MM-DD)"),
+# EventResponse only documents the schema; event_dicts() already builds exactly
+# these fields, so a response_model would just re-validate every event
+@app.get("/api/events", responses={200: {"model": List[EventResponse]}})
+def get_events(
+    start_date: Optional[date] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="End date (YYYY-MM-DD)"),
+    date: Optional[date] = Query(None, description="Specific date (YYYY-MM-DD)"),
     city: Optional[str] = Query(None, description="Filter by city"),
     venue: Optional[str] = Query(None, description="Filter by venue"),
     genre: Optional[str] = Query(None, description="Filter by genre"),
@@ -188,63 +330,60 @@ async def get_events(
     limit: Optional[int] = Query(None, description="Limit number of results"),
     db: Session = Depends(get_db)
 ):
-    """Get events with optional filters"""
-    
-    # Start with base query
-    query = db.query(Event).options(
-        joinedload(Event.venue),
-        joinedload(Event.genres),
-        joinedload(Event.promoters),
-        joinedload(Event.extra_links)
-    )
+    """Get events with optional filters
+    
+    Dates arrive already parsed; FastAPI answers malformed ones with a 422.
+    """
+    
+    # Start with base query (venues are always outer-joined in EVENT_ROWS)
+    query = EVENT_ROWS
     
     # Apply filters
     if not hidden:
-        query = query.filter(Event.hidden == False)
+        query = query.where(Event.hidden == False)
     
     if date:
         # Specific date takes precedence
-        query = query.filter(Event.date == datetime.strptime(date, '%Y-%m-%d').date())
+        query = query.where(Event.date == date)
     else:
         if start_date:
-            query = query.filter(Event.date >= datetime.strptime(start_date, '%Y-%m-%d').date())
+            query = query.where(Event.date >= start_date)
         if end_date:
-            query = query.filter(Event.date <= datetime.strptime(end_date, '%Y-%m-%d').date())
+            query = query.where(Event.date <= end_date)
     
     if city:
-        query = query.join(Venue).filter(Venue.city == city)
+        query = query.where(Venue.city == city)
     
     if venue:
-        query = query.join(Venue).filter(Venue.name == venue)
+        query = query.where(Venue.name == venue)
     
+    if is_tba is not None:
+        query = query.where(func.coalesce(Venue.is_tba, False) == is_tba)
+    
+    # EXISTS rather than a join, so an event matching several genres or
+    # promoters is still one row and LIMIT counts events
     if genre:
-        query = query.join(Event.genres).filter(Genre.name.ilike(f"%{genre}%"))
+        query = query.where(Event.genres.any(Genre.name.ilike(f"%{genre}%")))
     
     if promoter:
-        query = query.join(Event.promoters).filter(Promoter.name.ilike(f"%{promoter}%"))
+        query = query.where(Event.promoters.any(Promoter.name.ilike(f"%{promoter}%")))
     
     if day_of_week is not None:
-        # SQLite doesn't have native day of week, so we fetch all and filter in Python
-        events = query.all()
-        events = [e for e in events if e.date and e.date.weekday() == day_of_week]
-    else:
-        events = query.all()
-    
-    if is_tba is not None:
-        if is_tba:
-            events = [e for e in events if e.venue and e.venue.is_tba]
+        if 0 <= day_of_week <= 6:
+            # strftime('%w') counts from Sunday=0; Python's weekday() from Monday=0
+            query = query.where(func.strftime('%w', Event.date) == str((day_of_week + 1) % 7))
         else:
-            events = [e for e in events if not (e.venue and e.venue.is_tba)]
+            query = query.where(false())
     
-    # Apply limit
+    # Apply limit in SQL so only the returned rows are loaded
     if limit:
-        events = events[:limit]
+        query = query.limit(limit)
     
     # Convert to response format
-    return [event.to_dict() for event in events]
+    return event_dicts(db, query)
 
 @app.get("/api/events/by-date/{date_str}")
-async def get_events_by_date(
+def get_events_by_date(
     date_str: str,
     db: Session = Depends(get_db)
 ):
@@ -254,37 +393,23 @@ async def get_events_by_date(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
     
-    events = db.query(Event).filter(
+    return event_dicts(db, EVENT_ROWS.where(
         Event.date == event_date,
         Event.hidden == False
-    ).options(
-        joinedload(Event.venue),
-        joinedload(Event.genres),
-        joinedload(Event.promoters),
-        joinedload(Event.extra_links)
-    ).all()
-    
-    return [event.to_dict() for event in events]
+    ))
 
 @app.get("/api/events/today")
-async def get_todays_events(db: Session = Depends(get_db)):
+def get_todays_events(db: Session = Depends(get_db)):
     """Get today's events"""
     today = date.today()
     
-    events = db.query(Event).filter(
+    return cached_json(("today", today), lambda: event_dicts(db, EVENT_ROWS.where(
         Event.date == today,
         Event.hidden == False
-    ).options(
-        joinedload(Event.venue),
-        joinedload(Event.genres),
-        joinedload(Event.promoters),
-        joinedload(Event.extra_links)
-    ).all()
-    
-    return [event.to_dict() for event in events]
+    )))
 
 @app.get("/api/events/weekend")
-async def get_weekend_events(db: Session = Depends(get_db)):
+def get_weekend_events(db: Session = Depends(get_db)):
     """Get this weekend's events (Friday-Sunday)"""
     today = date.today()
     
@@ -295,58 +420,51 @@ async def get_weekend_events(db: Session = Depends(get_db)):
     friday = today + timedelta(days=days_until_friday)
     sunday = friday + timedelta(days=2)
     
-    events = db.query(Event).filter(
+    return cached_json(("weekend", friday), lambda: event_dicts(db, EVENT_ROWS.where(
         Event.date >= friday,
         Event.date <= sunday,
         Event.hidden == False
-    ).options(
-        joinedload(Event.venue),
-        joinedload(Event.genres),
-        joinedload(Event.promoters),
-        joinedload(Event.extra_links)
-    ).all()
-    
-    return [event.to_dict() for event in events]
+    )))
 
 @app.get("/api/events/tba")
-async def get_tba_events(db: Session = Depends(get_db)):
+def get_tba_events(db: Session = Depends(get_db)):
     """Get all TBA venue events"""
-    events = db.query(Event).join(Venue).filter(
+    return cached_json(("tba",), lambda: tba_event_dicts(db))
+
+def tba_event_dicts(db: Session) -> List[Dict[str, Any]]:
+    """Visible TBA venue events with their venue hints"""
+    events = event_dicts(db, EVENT_ROWS.where(
         Venue.is_tba == True,
         Event.hidden == False
-    ).options(
-        joinedload(Event.venue),
-        joinedload(Event.genres),
-        joinedload(Event.promoters),
-        joinedload(Event.extra_links)
-    ).all()
-    
-    # Add TBA hints
-    result = []
-    for event in events:
-        event_dict = event.to_dict()
-        
-        # Get hints for this event
-        hints = db.query(TBAVenueHint).filter(
-            TBAVenueHint.event_id == event.id
-        ).all()
-        
-        event_dict['venue_hints'] = [
-            {
-                'type': hint.hint_type,
-                'text': hint.hint_text,
-                'confidence': hint.confidence
-            }
-            for hint in hints
-        ]
-        
-        result.append(event_dict)
-    
-    return result
+    ))
+    
+    # Load every event's hints in one IN query (the Event.tba_hints order),
+    # as plain rows like the rest of event_dicts
+    hints_by_event = defaultdict(list)
+    if events:
+        for event_id, hint_type, hint_text, confidence in db.execute(
+            select(TBAVenueHint.event_id, TBAVenueHint.hint_type, TBAVenueHint.hint_text, TBAVenueHint.confidence)
+            .where(TBAVenueHint.event_id.in_([e['id'] for e in events]))
+            .order_by(TBAVenueHint.id)
+        ):
+            hints_by_event[event_id].append({
+                'type': hint_type,
+                'text': hint_text,
+                'confidence': confidence
+            })
+    
+    for event_dict in events:
+        event_dict['venue_hints'] = hints_by_event[event_dict['id']]
+    
+    return events
 
 @app.get("/api/events/stats")
-async def get_stats(db: Session = Depends(get_db)):
+def get_stats(db: Session = Depends(get_db)):
     """Get statistics about the events"""
+    return cached_json(("stats",), lambda: build_stats(db))
+
+def build_stats(db: Session) -> Dict[str, Any]:
+    """Database totals plus the cities and genres in use"""
     stats = EventQueries.get_stats(db)
     
     # Add more detailed stats
@@ -362,23 +480,21 @@ async def get_stats(db: Session = Depends(get_db)):
     return stats
 
 @app.get("/api/venues")
-async def get_venues(
+def get_venues(
     include_tba: bool = Query(False, description="Include TBA venues"),
     db: Session = Depends(get_db)
 ):
     """Get all unique venues with their locations"""
-    query = db.query(Venue)
+    # Count each venue's events in the same query instead of one COUNT per venue
+    query = db.query(Venue, func.count(Event.id)).outerjoin(Event, Event.venue_id == Venue.id)
     
     if not include_tba:
         query = query.filter(Venue.is_tba == False)
     
-    venues = query.all()
+    rows = query.group_by(Venue.id).all()
     
-    result = []
-    for venue in venues:
-        event_count = db.query(Event).filter(Event.venue_id == venue.id).count()
-        
-        result.append({
+    result = [
+        {
             "id": venue.id,
             "name": venue.name,
             "city": venue.city,
@@ -390,19 +506,20 @@ async def get_venues(
             } if venue.latitude else None,
             "is_tba": venue.is_tba,
             "event_count": event_count
-        })
+        }
+        for venue, event_count in rows
+    ]
     
-    return result
+    return ORJSONResponse(result)
 
 @app.get("/api/genres")
-async def get_genres(db: Session = Depends(get_db)):
+def get_genres(db: Session = Depends(get_db)):
     """Get all genres with event counts"""
-    genres = db.query(
-        Genre.name,
-        func.count(Event.id).label('event_count')
-    ).join(Genre.events).filter(
-        Event.hidden == False
-    ).group_by(Genre.name).order_by(Genre.name).all()
+    return cached_json(("genres",), lambda: genre_counts(db))
+
+def genre_counts(db: Session) -> List[Dict[str, Any]]:
+    """Each genre's number of visible events, by name (counted at scrape time)"""
+    genres = db.query(GenreStat.name, GenreStat.event_count).order_by(GenreStat.name).all()
     
     return [
         {"name": name, "event_count": count}
@@ -410,150 +527,123 @@ async def get_genres(db: Session = Depends(get_db)):
     ]
 
 @app.get("/api/promoters")
-async def get_promoters(db: Session = Depends(get_db)):
+def get_promoters(db: Session = Depends(get_db)):
     """Get all promoters with event counts"""
-    promoters = db.query(
-        Promoter.name,
-        func.count(Event.id).label('event_count')
-    ).join(Promoter.events).filter(
-        Event.hidden == False
-    ).group_by(Promoter.name).order_by(Promoter.name).all()
+    return cached_json(("promoters",), lambda: promoter_counts(db))
+
+def promoter_counts(db: Session) -> List[Dict[str, Any]]:
+    """Each promoter's number of visible events, by name (counted at scrape time)"""
+    promoters = db.query(PromoterStat.name, PromoterStat.event_count).order_by(PromoterStat.name).all()
     
     return [
         {"name": name, "event_count": count}
         for name, count in promoters
     ]
 
+SEARCH_COLUMNS = {
+    "all": None,
+    "title": "title",
+    "venue": "venue",
+    "genre": "genres",
+    "promoter": "promoters"
+}
+
 @app.get("/api/search")
-async def search_events(
+def search_events(
     q: str = Query(..., description="Search query"),
     field: Optional[str] = Query("all", description="Field to search (title, venue, genre, promoter, all)"),
     db: Session = Depends(get_db)
 ):
     """Search events by text"""
-    search_term = f"%{q}%"
-    
-    if field == "all":
-        events = db.query(Event).filter(
-            Event.hidden == False
-        ).filter(
-            or_(
-                Event.title.ilike(search_term),
-                Event.venue.has(Venue.name.ilike(search_term)),
-                Event.genres.any(Genre.name.ilike(search_term)),
-                Event.promoters.any(Promoter.name.ilike(search_term))
-            )
-        ).options(
-            joinedload(Event.venue),
-            joinedload(Event.genres),
-            joinedload(Event.promoters),
-            joinedload(Event.extra_links)
-        ).all()
-    elif field == "title":
-        events = db.query(Event).filter(
-            Event.hidden == False,
-            Event.title.ilike(search_term)
-        ).options(
-            joinedload(Event.venue),
-            joinedload(Event.genres),
-            joinedload(Event.promoters),
-            joinedload(Event.extra_links)
-        ).all()
-    elif field == "venue":
-        events = db.query(Event).join(Venue).filter(
-            Event.hidden == False,
-            Venue.name.ilike(search_term)
-        ).options(
-            joinedload(Event.venue),
-            joinedload(Event.genres),
-            joinedload(Event.promoters),
-            joinedload(Event.extra_links)
-        ).all()
-    elif field == "genre":
-        events = db.query(Event).join(Event.genres).filter(
-            Event.hidden == False,
-            Genre.name.ilike(search_term)
-        ).options(
-            joinedload(Event.venue),
-            joinedload(Event.genres),
-            joinedload(Event.promoters),
-            joinedload(Event.extra_links)
-        ).all()
-    elif field == "promoter":
-        events = db.query(Event).join(Event.promoters).filter(
-            Event.hidden == False,
-            Promoter.name.ilike(search_term)
-        ).options(
-            joinedload(Event.venue),
-            joinedload(Event.genres),
-            joinedload(Event.promoters),
-            joinedload(Event.extra_links)
-        ).all()
-    else:
-        events = []
+    # FTS5 column for each searchable field; "all" matches any column
+    if field not in SEARCH_COLUMNS:
+        return []
     
-    return [event.to_dict() for event in events]
+    event_ids = EventQueries.search_event_ids(db, q, SEARCH_COLUMNS[field])
+    if not event_ids:
+        return []
+    
+    return event_dicts(db, EVENT_ROWS.where(
+        Event.id.in_(event_ids),
+        Event.hidden == False
+    ).order_by(Event.id))
 
 # Serve static files (keep compatibility with JSON endpoints)
 @app.get("/events_organized.json")
-async def get_organized_json(request: Request, db: Session = Depends(get_db)):
+def get_organized_json(request: Request, db: Session = Depends(get_db)):
     """Generate organized JSON from database"""
+    global ORGANIZED_CACHE, ORGANIZED_GZIP
     logfire.info(
         'Legacy JSON endpoint accessed',
         service='api',
         event_type='api_request',
         endpoint='/events_organized.json'
     )
-    events = db.query(Event).filter(
+    if ORGANIZED_CACHE is None:
+        ORGANIZED_CACHE = build_organized_json(db)
+        # Compressed once here rather than by the middleware on every request
+        ORGANIZED_GZIP = gzip.compress(ORGANIZED_CACHE, compresslevel=5)
+    
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        return Response(
+            ORGANIZED_GZIP,
+            media_type="application/json",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+    return Response(ORGANIZED_CACHE, media_type="application/json")
+
+def build_organized_json(db: Session) -> bytes:
+    """Encode every visible event grouped by date, with filter metadata
+    
+    Each date bucket is encoded on its own and the pieces are spliced, so
+    the whole events_by_date tree is never held as Python objects.
+    """
+    events = event_dicts(db, EVENT_ROWS.where(
         Event.hidden == False
-    ).options(
-        joinedload(Event.venue),
-        joinedload(Event.genres),
-        joinedload(Event.promoters),
-        joinedload(Event.extra_links)
-    ).order_by(Event.date).all()
-    
-    # Group by date
-    events_by_date = {}
-    for event in events:
-        date_str = event.date.isoformat() if event.date else 'unknown'
-        if date_str not in events_by_date:
-            events_by_date[date_str] = []
-        events_by_date[date_str].append(event.to_dict())
+    ).order_by(Event.date))
+    
+    # Group by date (rows arrive sorted, so each date is one run)
+    buckets = [
+        orjson.dumps(day or 'unknown') + b':' + orjson.dumps(list(group))
+        for day, group in groupby(events, key=itemgetter('dateISO'))
+    ]
     
     # Get metadata
     stats = EventQueries.get_stats(db)
-    
-    return {
-        'metadata': {
-            'date_range': stats['date_range'],
-            'available_filters': {
-                'cities': [v.city for v in db.query(Venue.city).distinct().all() if v.city],
-                'genres': [g.name for g in db.query(Genre).order_by(Genre.name).all()],
-                'venues': [v.name for v in db.query(Venue).filter(Venue.is_tba == False).all()],
-                'promoters': [p.name for p in db.query(Promoter).order_by(Promoter.name).all()]
-            },
-            'statistics': stats
+    metadata = {
+        'date_range': stats['date_range'],
+        'available_filters': {
+            'cities': [city for city in db.scalars(select(Venue.city).distinct()) if city],
+            'genres': db.scalars(select(Genre.name).order_by(Genre.name)).all(),
+            'venues': db.scalars(select(Venue.name).where(Venue.is_tba == False)).all(),
+            'promoters': db.scalars(select(Promoter.name).order_by(Promoter.name)).all()
         },
-        'events_by_date': events_by_date,
-        'generated_at': datetime.now().isoformat()
+        'statistics': stats
     }
+    
+    return b''.join((
+        b'{"metadata":', orjson.dumps(metadata),
+        b',"events_by_date":{', b','.join(buckets),
+        b'},"generated_at":', orjson.dumps(datetime.now().isoformat()), b'}'
+    ))
 
 @app.get("/events_tba.json")
-async def get_tba_json(db: Session = Depends(get_db)):
+def get_tba_json(db: Session = Depends(get_db)):
     """Get TBA events as JSON"""
-    return await get_tba_events(db)
+    return get_tba_events(db)
 
 @app.get("/status")
-async def status_check(db: Session = Depends(get_db)):
+def status_check(db: Session = Depends(get_db)):
     """Detailed status check"""
     try:
-        event_count = db.query(Event).count()
-        venue_count = db.query(Venue).count()
+        # Both totals in one round trip
+        event_count, venue_count = db.query(
+            select(func.count(Event.id)).scalar_subquery(),
+            select(func.count(Venue.id)).scalar_subquery()
+        ).one()
         
-        # Check for specific venue fix
-        bar_part_time = db.query(Venue).filter(Venue.name == "Bar Part Time").first()
-        bar_only = db.query(Venue).filter(Venue.name == "Bar").first()
+        # Check for specific venue fix (both names in one query)
+        venue_names = set(db.scalars(select(Venue.name).where(Venue.name.in_(["Bar Part Time", "Bar"]))))
         
         return {
             "status": "operational",
@@ -563,8 +653,8 @@ async def status_check(db: Session = Depends(get_db)):
             },
             "scraping": scraping_status,
             "venue_check": {
-                "bar_part_time_exists": bar_part_time is not None,
-                "bar_only_exists": bar_only is not None
+                "bar_part_time_exists": "Bar Part Time" in venue_names,
+                "bar_only_exists": "Bar" in venue_names
             },
             "timestamp": datetime.now().isoformat()
         }
@@ -576,7 +666,7 @@ async def status_check(db: Session = Depends(get_db)):
         }
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+def health_check(db: Session = Depends(get_db)):
     """Health check endpoint"""
     # Try a simple query to check DB connection
     try:
@@ -629,11 +719,8 @@ async def trigger_scrape(request: Request):
         result = await scrape_and_update()
         scraping_status["last_scrape"] = datetime.now().isoformat()
         
-        # Get event count
-        db = SessionLocal()
-        event_count = db.query(Event).count()
-        scraping_status["events_count"] = event_count
-        db.close()
+        # The scraper counted the events while rebuilding the search index
+        event_count = scraping_status["events_count"] = result['total_events']
         
         logfire.info(
             'Scraping completed via API',
@@ -662,6 +749,8 @@ async def trigger_scrape(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         scraping_status["is_scraping"] = False
+        # Even a failed scrape may have committed some batches
+        invalidate_response_caches()
 
 def main():
     """Main entry point for the application."""
@@ -684,6 +773,8 @@ def main():
         host="0.0.0.0", 
         port=port, 
         reload=not is_production,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
 
@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
-import json
 import os
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import orjson
+
+def _write_file(item):
+    """Write one pre-encoded file (runs in a worker thread)"""
+    path, payload = item
+    Path(path).write_bytes(payload)
 
 def split_events_by_day(input_file='events-2025-08-29T19-48-28.json', output_dir='events_by_day'):
     # Read the main events file
-    with open(input_file, 'r') as f:
-        events = json.load(f)
+    events = orjson.loads(Path(input_file).read_bytes())
     
     # Group events by date
     events_by_date = defaultdict(list)
@@ -17,14 +23,17 @@ def split_events_by_day(input_file='events-2025-08-29T19-48-28.json', output_dir
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Write each day's events to a separate file
+    # Encode each day's events, then let a thread pool overlap the writes
     file_list = []
+    pairs = []
     for date, day_events in sorted(events_by_date.items()):
         output_file = os.path.join(output_dir, f'events_{date}.json')
-        with open(output_file, 'w') as f:
-            json.dump(day_events, f, indent=2)
+        pairs.append((output_file, orjson.dumps(day_events, option=orjson.OPT_INDENT_2)))
         file_list.append(f'{output_file}: {len(day_events)} events')
     
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(_write_file, pairs))
+    
     # Create an index file with metadata
     index = {
         'total_events': len(events),
@@ -33,8 +42,7 @@ def split_events_by_day(input_file='events-2025-08-29T19-48-28.json', output_dir
         'files': [f'events_{date}.json' for date in sorted(events_by_date.keys())]
     }
     
-    with open(os.path.join(output_dir, 'index.json'), 'w') as f:
-        json.dump(index, f, indent=2)
+    Path(output_dir, 'index.json').write_bytes(orjson.dumps(index, option=orjson.OPT_INDENT_2))
     
     print(f"✅ Split {len(events)} events into {len(events_by_date)} files")
     print(f"📁 Output directory: {output_dir}/")